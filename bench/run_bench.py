@@ -0,0 +1,225 @@
+"""offline benchmark for the price extraction pipeline
+
+serves the saved pages in bench/corpus from a local http server, runs each extraction
+strategy against every page and reports per-stage timings, correctness and memory as json.
+
+    python bench/run_bench.py --repeat 20 --output bench_output.json
+    python bench/run_bench.py --chrome --baseline bench_output.json
+"""
+import argparse
+import functools
+import json
+import logging
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CORPUS = os.path.join(ROOT, 'bench', 'corpus')
+sys.path.insert(0, ROOT)
+
+from fetcher import HttpFetcher
+from retailers import plan_named
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_corpus():
+    """serve the corpus on a free localhost port from a background thread"""
+    handler = functools.partial(QuietHandler, directory=CORPUS)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def load_manifest():
+    with open(os.path.join(CORPUS, 'manifest.json'), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def summarize(samples):
+    return {
+        'min': min(samples),
+        'median': statistics.median(samples),
+        'max': max(samples),
+    }
+
+
+def run_http(fetcher, plan, url):
+    timings = {}
+    started = time.monotonic()
+    price, path, challenge, transferred = fetcher.fetch_price(url, timings, plan)
+    timings['total'] = time.monotonic() - started
+    return price, path, challenge, transferred, timings
+
+
+def run_chrome(driver, plan, url):
+    from scraper import SelectorOrder, get_chrome_price
+
+    timings = {}
+    started = time.monotonic()
+    # a fresh order each run so the adaptive ordering doesn't hide selector search cost
+    price, transferred, _ = get_chrome_price(driver, url, SelectorOrder(plan.selectors), timings, plan=plan)
+    timings['total'] = time.monotonic() - started
+    return price, 'chrome', False, transferred, timings
+
+
+def bench_strategy(name, run, base_url, manifest, repeat):
+    results = []
+    for fixture in manifest:
+        url = f"{base_url}/{fixture['file']}"
+        stage_samples = {}
+        outcome = None
+        for _ in range(repeat):
+            price, path, challenge, transferred, timings = run(url)
+            outcome = (price, path, challenge, transferred)
+            for stage, seconds in timings.items():
+                stage_samples.setdefault(stage, []).append(seconds)
+
+        price, path, challenge, transferred = outcome
+        expected = fixture['price']
+        if name == 'http' and not fixture['structured']:
+            # pages without structured data are meant to miss over http and fall back to chrome
+            expected = None
+        correct = price == expected and (name != 'http' or challenge == fixture['challenge'])
+        results.append({
+            'fixture': fixture['file'],
+            'strategy': name,
+            'expected': expected,
+            'price': price,
+            'path': path,
+            'correct': correct,
+            'challenge_detected': challenge,
+            'transferred': transferred,
+            'stages': {stage: summarize(samples) for stage, samples in stage_samples.items()},
+        })
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, baseline, threshold, memory_threshold, min_delta=0.001):
+    """print median total-time and memory changes against a baseline report and return the regressions
+
+    a slowdown only counts when it is over threshold and at least min_delta seconds, since
+    loopback http timings of a few ms move by more than threshold from run to run.
+    """
+    old = {(r['fixture'], r['strategy']): r for r in baseline['results']}
+    regressions = []
+    for result in report['results']:
+        previous = old.get((result['fixture'], result['strategy']))
+        if previous is None or 'total' not in previous['stages']:
+            continue
+        before = previous['stages']['total']['median']
+        after = result['stages']['total']['median']
+        change = (after - before) / before if before else 0.0
+        flag = ''
+        if change > threshold and after - before >= min_delta:
+            flag = '  REGRESSION'
+            regressions.append(result)
+        if previous['correct'] and not result['correct']:
+            flag += '  NOW INCORRECT'
+            regressions.append(result)
+        print(f"{result['strategy']:>6} {result['fixture']:<30} {before * 1000:8.2f}ms -> {after * 1000:8.2f}ms ({change:+.0%}){flag}", file=sys.stderr)
+
+    for key, after in report['memory'].items():
+        before = baseline.get('memory', {}).get(key)
+        # chrome_rss is only measured with --chrome, and is None off linux
+        if not before or after is None:
+            continue
+        change = (after - before) / before
+        flag = ''
+        if change > memory_threshold:
+            flag = '  REGRESSION'
+            regressions.append({'memory': key, 'before': before, 'after': after})
+        print(f"memory {key:<30} {before / 1024 / 1024:8.1f}MB -> {after / 1024 / 1024:8.1f}MB ({change:+.0%}){flag}", file=sys.stderr)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=10, help='runs per fixture and strategy')
+    parser.add_argument('--chrome', action='store_true', help='also benchmark the chromedriver path')
+    parser.add_argument('--output', help='write the json report here instead of stdout')
+    parser.add_argument('--baseline', help='json report from an earlier commit to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2, help='median slowdown that counts as a regression')
+    parser.add_argument('--min-delta', type=float, default=1.0, help='smallest median slowdown in ms that counts as a regression')
+    parser.add_argument('--memory-threshold', type=float, default=0.2, help='memory growth that counts as a regression')
+    parser.add_argument('--retailer', default='walmart', help='extraction plan to read the corpus with')
+    args = parser.parse_args()
+
+    plan = plan_named(args.retailer)
+    if plan is None:
+        parser.error(f"no retailer plan named {args.retailer!r}")
+
+    logging.basicConfig(level=logging.WARNING)
+    server, base_url = serve_corpus()
+    manifest = load_manifest()
+
+    report = {
+        'commit': git_commit(),
+        'timestamp': time.time(),
+        'python': platform.python_version(),
+        'repeat': args.repeat,
+        'retailer': plan.name,
+        'results': [],
+        'memory': {},
+    }
+
+    fetcher = HttpFetcher()
+    report['results'] += bench_strategy('http', functools.partial(run_http, fetcher, plan), base_url, manifest, args.repeat)
+    fetcher.close()
+
+    if args.chrome:
+        from browser import launch_driver, process_tree_rss
+
+        started = time.monotonic()
+        driver = launch_driver()
+        report['driver_startup'] = time.monotonic() - started
+        try:
+            report['results'] += bench_strategy('chrome', functools.partial(run_chrome, driver, plan), base_url, manifest, args.repeat)
+            report['memory']['chrome_rss'] = process_tree_rss(getattr(driver, 'browser_pid', None))
+        finally:
+            driver.quit()
+
+    # ru_maxrss is kilobytes on linux
+    report['memory']['python_max_rss'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    server.shutdown()
+
+    for result in report['results']:
+        total = result['stages']['total']['median'] * 1000
+        status = 'ok' if result['correct'] else f"WRONG (got {result['price']}, expected {result['expected']})"
+        print(f"{result['strategy']:>6} {result['fixture']:<30} {total:8.2f}ms  {status}", file=sys.stderr)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(report, json.load(f), args.threshold, args.memory_threshold, args.min_delta / 1000)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
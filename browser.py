@@ -0,0 +1,437 @@
+import logging
+import os
+import shutil
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    # no flock on windows; profiles are then only coordinated within one process
+    fcntl = None
+
+from metrics import DRIVER_RESTARTS
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+# recycle a browser after this many page loads or once its process tree passes this much memory
+DRIVER_MAX_NAVIGATIONS = int(os.getenv('DRIVER_MAX_NAVIGATIONS', '200'))
+DRIVER_MAX_RSS_MB = int(os.getenv('DRIVER_MAX_RSS_MB', '1500'))
+# keep a second, pre-launched browser per worker to swap in on recycle or crash
+DRIVER_WARM_STANDBY = os.getenv('DRIVER_WARM_STANDBY', '0') == '1'
+# launch each worker's browser in the background at startup instead of on its first fallback check
+PREWARM_DRIVERS = os.getenv('PREWARM_DRIVERS', '1') == '1'
+# persistent chrome profiles, one per worker, so cookies, cache and passed challenges survive
+# relaunches; an empty PROFILE_DIR launches every browser with a fresh temporary profile
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'chrome_profiles')
+# disk cache cap per profile, enforced by chrome while running and by pruning before each launch
+PROFILE_CACHE_MB = int(os.getenv('PROFILE_CACHE_MB', '256'))
+# cache directories inside a profile that are safe to delete while chrome is not running
+PROFILE_CACHE_DIRS = (
+    'Default/Cache', 'Default/Code Cache', 'Default/GPUCache', 'Default/Service Worker/CacheStorage',
+    'Default/Service Worker/ScriptCache', 'GrShaderCache', 'GraphiteDawnCache', 'ShaderCache',
+)
+# relaunch backoff after failed launches: 5s, 10s, 20s, ... capped at 5 minutes
+RELAUNCH_BACKOFF_BASE = 5
+RELAUNCH_BACKOFF_MAX = 300
+
+# 'eager' returns from driver.get at DOMContentLoaded, 'none' as soon as navigation commits
+PAGE_LOAD_STRATEGY = os.getenv('PAGE_LOAD_STRATEGY', 'eager')
+
+# request patterns blocked through the devtools protocol, grouped by resource type.
+# BLOCKED_RESOURCE_TYPES picks the groups, BLOCKED_URL_PATTERNS adds extra patterns.
+BLOCK_GROUPS = {
+    # walmart's image host also serves the page's scripts and fonts under /dfw/, so only
+    # its product and banner image paths are blocked by host
+    'image': [
+        '*.png*', '*.jpg*', '*.jpeg*', '*.gif*', '*.webp*', '*.avif*', '*.svg*', '*.ico*',
+        '*i5.walmartimages.com/asr/*', '*i5.walmartimages.com/seo/*',
+    ],
+    'font': ['*.woff*', '*.woff2*', '*.ttf*', '*.otf*', '*.eot*'],
+    'media': ['*.mp4*', '*.webm*', '*.m3u8*', '*.mp3*'],
+    'analytics': [
+        '*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*', '*googlesyndication.com*',
+        '*facebook.net*', '*facebook.com/tr*', '*hotjar.com*', '*quantummetric.com*', '*criteo.*',
+        '*adsrvr.org*', '*bat.bing.com*', '*scorecardresearch.com*', '*crcldu.com*', '*beacon.walmart.com*',
+    ],
+}
+BLOCKED_RESOURCE_TYPES = [t.strip() for t in os.getenv('BLOCKED_RESOURCE_TYPES', 'image,font,media,analytics').split(',') if t.strip()]
+BLOCKED_URL_PATTERNS = [p.strip() for p in os.getenv('BLOCKED_URL_PATTERNS', '').split(',') if p.strip()]
+
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def blocked_url_patterns():
+    patterns = []
+    for resource_type in BLOCKED_RESOURCE_TYPES:
+        patterns.extend(BLOCK_GROUPS.get(resource_type, []))
+    return patterns + BLOCKED_URL_PATTERNS
+
+
+def directory_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                continue
+    return total
+
+
+def prune_profile_cache(profile_dir, max_bytes=PROFILE_CACHE_MB * 1024 * 1024):
+    """delete a stopped profile's largest cache directories until its caches fit in max_bytes"""
+    sizes = []
+    for relative in PROFILE_CACHE_DIRS:
+        path = os.path.join(profile_dir, relative)
+        if os.path.isdir(path):
+            sizes.append((directory_size(path), path))
+    total = sum(size for size, _ in sizes)
+    if total <= max_bytes:
+        return 0
+    freed = 0
+    for size, path in sorted(sizes, reverse=True):
+        if total - freed <= max_bytes:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        freed += size
+    logger.info(f"pruned {freed / 1024 / 1024:.0f} MB of cache from {profile_dir}")
+    return freed
+
+
+def lock_profile(profile_dir):
+    """take an exclusive lock on a profile for this process, returning the lock file's fd,
+    or None if another process holds the profile"""
+    if fcntl is None:
+        return -1
+    os.makedirs(os.path.dirname(profile_dir) or '.', exist_ok=True)
+    fd = os.open(f'{profile_dir}.lock', os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(fd)
+        return None
+    return fd
+
+
+def unlock_profile(fd):
+    if fd is not None and fd >= 0:
+        # closing the fd drops the flock
+        os.close(fd)
+
+
+def browser_cookies(driver):
+    """every cookie in the browser's profile, not just the current page's, as devtools dicts"""
+    try:
+        return driver.execute_cdp_cmd('Network.getAllCookies', {}).get('cookies', [])
+    except Exception as e:
+        logger.debug(f"devtools cookie read failed, using the current page's cookies: {e}")
+        return driver.get_cookies()
+
+
+def launch_driver(profile_dir=None):
+    """setup undetected chromedriver in headless mode, on a persistent profile if profile_dir is given"""
+    # imported here: undetected_chromedriver pulls in selenium and takes most of a second to load
+    import undetected_chromedriver as uc
+
+    options = uc.ChromeOptions()
+
+    # headless
+    options.add_argument('--headless=new')
+    options.add_argument('--no-sandbox')
+    options.add_argument('--disable-dev-shm-usage')
+    options.add_argument('--disable-blink-features=AutomationControlled')
+    options.add_argument('--disable-extensions')
+    options.add_argument('--disable-plugins')
+    options.add_argument('--disable-images')
+    options.add_argument('--blink-settings=imagesEnabled=false')
+
+    # stealth
+    options.add_argument('--disable-web-security')
+    options.add_argument('--allow-running-insecure-content')
+    options.add_argument('--disable-notifications')
+    options.add_argument('--disable-popup-blocking')
+    options.add_argument('--ignore-certificate-errors')
+
+    # setting user agent
+    options.add_argument(f'--user-agent={USER_AGENT}')
+
+    # don't block driver.get on subresources, the scraper waits for the price itself
+    options.page_load_strategy = PAGE_LOAD_STRATEGY
+
+    if profile_dir:
+        os.makedirs(profile_dir, exist_ok=True)
+        prune_profile_cache(profile_dir)
+        options.add_argument(f'--disk-cache-size={PROFILE_CACHE_MB * 1024 * 1024}')
+
+    driver = uc.Chrome(
+        options=options,
+        use_subprocess=False,
+        headless=True,
+        user_data_dir=profile_dir
+    )
+
+    driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+
+    patterns = blocked_url_patterns()
+    if patterns:
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': patterns})
+        logger.info(f"blocking {len(patterns)} url patterns ({', '.join(BLOCKED_RESOURCE_TYPES)})")
+
+    logger.info("undetected chromedriver setup successfully in headless mode")
+    return driver
+
+
+def process_tree_rss(pid):
+    """resident memory in bytes of a process and all its descendants (linux /proc only), or None"""
+    if not pid or not os.path.isdir('/proc'):
+        return None
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f'/proc/{current}/statm') as f:
+                total += int(f.read().split()[1]) * PAGE_SIZE
+            for task in os.listdir(f'/proc/{current}/task'):
+                with open(f'/proc/{current}/task/{task}/children') as f:
+                    pending.extend(int(child) for child in f.read().split())
+        except (OSError, ValueError, IndexError):
+            continue
+    return total
+
+
+class DriverManager:
+    """owns one chromedriver: probes it before each use, relaunches it with backoff when it
+    dies, and recycles it after too many navigations or too much memory
+
+    with warm_standby a second browser is launched in the background so a recycle or
+    crash can swap to an already-running instance instead of paying a cold start.
+
+    with a profile_root each browser runs on a persistent profile under it. chrome locks a
+    profile while running, so a browser launched while another one is still up or quitting
+    gets the next free profile of this manager. profiles are also claimed with a lock file,
+    so a profile another process is running chrome on is skipped too.
+    """
+
+    # running browsers per manager: current, warm standby and one still quitting
+    MAX_PROFILES = 3
+
+    def __init__(self, name, launch=launch_driver, max_navigations=DRIVER_MAX_NAVIGATIONS,
+                 max_rss_mb=DRIVER_MAX_RSS_MB, warm_standby=DRIVER_WARM_STANDBY, profile_root=None):
+        self.name = name
+        self.profiles = []
+        if profile_root:
+            slug = name.replace(' ', '-')
+            self.profiles = [os.path.join(profile_root, f'{slug}-{i}') for i in range(self.MAX_PROFILES)]
+        self.launch = launch
+        self.max_navigations = max_navigations
+        self.max_rss_mb = max_rss_mb
+        self.warm_standby = warm_standby
+        self.navigations = 0
+        self.launches = 0
+        # browsers brought up to replace one that failed its probe or was recycled
+        self.restarts = 0
+        self.recycles = 0
+        self.failures = 0
+        self._driver = None
+        self._standby = None
+        self._standby_thread = None
+        self._profile_of = {}
+        self._profile_locks = {}
+        self._retry_at = 0
+        self._replacing = False
+        self._lock = threading.Lock()
+        # held while the current driver is checked or launched, so a background prewarm
+        # and a worker's first acquire never both launch a browser
+        self._use_lock = threading.Lock()
+
+    def acquire(self):
+        """return a healthy driver for one navigation, or None while relaunching is backed off"""
+        with self._use_lock:
+            return self._acquire()
+
+    def prewarm(self):
+        """launch the driver ahead of its first use, if it isn't running yet"""
+        with self._use_lock:
+            if self._driver is None:
+                self._driver = self._take_standby() or self._launch()
+                if self._driver is not None:
+                    self.navigations = 0
+                    logger.info(f"chromedriver for {self.name} prewarmed")
+
+    def _acquire(self):
+        if self._driver is not None:
+            if not self._alive(self._driver):
+                logger.warning(f"chromedriver for {self.name} failed its liveness probe, relaunching")
+                self._retire(self._driver)
+                self._driver = None
+                self._replacing = True
+            elif self._needs_recycle():
+                self.recycles += 1
+                self._retire(self._driver)
+                self._driver = None
+                self._replacing = True
+
+        if self._driver is None:
+            self._driver = self._take_standby() or self._launch()
+            if self._driver is None:
+                return None
+            self.navigations = 0
+            if self._replacing:
+                # a warm standby swapped in counts too; its own launch did not
+                self._replacing = False
+                self.restarts += 1
+                DRIVER_RESTARTS.inc()
+
+        self.navigations += 1
+        self._ensure_standby()
+        return self._driver
+
+    def close(self):
+        if self._standby_thread:
+            self._standby_thread.join()
+        with self._lock:
+            standby, self._standby = self._standby, None
+        # waits out a prewarm that is still launching, so its browser gets quit too
+        with self._use_lock:
+            driver, self._driver = self._driver, None
+        for driver in (driver, standby):
+            if driver:
+                self._quit(driver)
+
+    def _alive(self, driver):
+        try:
+            return driver.execute_script('return 1') == 1
+        except Exception as e:
+            logger.debug(f"liveness probe failed for {self.name}: {e}")
+            return False
+
+    def _needs_recycle(self):
+        if self.navigations >= self.max_navigations:
+            logger.info(f"recycling chromedriver for {self.name} after {self.navigations} navigations")
+            return True
+        rss = process_tree_rss(getattr(self._driver, 'browser_pid', None))
+        if rss is not None and rss > self.max_rss_mb * 1024 * 1024:
+            logger.info(f"recycling chromedriver for {self.name} at {rss / 1024 / 1024:.0f} MB rss")
+            return True
+        return False
+
+    def _launch(self):
+        if time.monotonic() < self._retry_at:
+            return None
+        profile = self._claim_profile()
+        try:
+            driver = self.launch(profile)
+        except Exception as e:
+            self._release_profile(profile)
+            self.failures += 1
+            delay = min(RELAUNCH_BACKOFF_BASE * 2 ** (self.failures - 1), RELAUNCH_BACKOFF_MAX)
+            self._retry_at = time.monotonic() + delay
+            logger.error(f"error setting up chromedriver for {self.name}: {e} (retrying in {delay}s)")
+            return None
+        self.failures = 0
+        self.launches += 1
+        if profile:
+            with self._lock:
+                self._profile_of.pop(('launching', profile), None)
+                self._profile_of[id(driver)] = profile
+        return driver
+
+    def _claim_profile(self):
+        """the first of this manager's profiles no running browser holds, in this process or
+        any other, or None for a fresh one"""
+        with self._lock:
+            busy = set(self._profile_of.values())
+            for profile in self.profiles:
+                if profile in busy:
+                    continue
+                fd = lock_profile(profile)
+                if fd is None:
+                    logger.info(f"profile {profile} is locked by another process, trying the next one")
+                    continue
+                # held under a placeholder key until the launch returns the driver
+                self._profile_of[('launching', profile)] = profile
+                self._profile_locks[profile] = fd
+                return profile
+        if self.profiles:
+            logger.warning(f"all profiles of {self.name} are in use, launching with a fresh one")
+        return None
+
+    def _release_profile(self, profile):
+        if profile:
+            with self._lock:
+                self._profile_of.pop(('launching', profile), None)
+                unlock_profile(self._profile_locks.pop(profile, None))
+
+    def _ensure_standby(self):
+        if not self.warm_standby or self._standby is not None:
+            return
+        if self._standby_thread and self._standby_thread.is_alive():
+            return
+        self._standby_thread = threading.Thread(target=self._prewarm, name=f'{self.name}-standby', daemon=True)
+        self._standby_thread.start()
+
+    def _prewarm(self):
+        driver = self._launch()
+        if driver is not None:
+            with self._lock:
+                self._standby = driver
+            logger.info(f"warm standby chromedriver ready for {self.name}")
+
+    def _take_standby(self):
+        if not self.warm_standby:
+            return None
+        if self._standby_thread and self._standby_thread.is_alive():
+            # a standby that is part-way through launching still beats a cold start
+            self._standby_thread.join()
+        with self._lock:
+            driver, self._standby = self._standby, None
+        if driver is not None and not self._alive(driver):
+            self._quit(driver)
+            return None
+        return driver
+
+    def _retire(self, driver):
+        # quitting chrome can take seconds, so don't make the check wait for it
+        threading.Thread(target=self._quit, args=(driver,), name=f'{self.name}-quit', daemon=True).start()
+
+    def _quit(self, driver):
+        try:
+            driver.quit()
+        except Exception as e:
+            logger.debug(f"error quitting chromedriver for {self.name}: {e}")
+        # only reuse the profile once chrome has let go of it
+        with self._lock:
+            profile = self._profile_of.pop(id(driver), None)
+            if profile:
+                unlock_profile(self._profile_locks.pop(profile, None))
+
+
+class DriverPool:
+    """fixed number of managed chromedrivers, one per scrape worker, launched on first use
+
+    name prefixes each worker's name and profile directory, so pools running side by side
+    (bot, worker processes, sweeps) never try to open the same profile.
+    """
+
+    def __init__(self, size, name='worker', profile_root=PROFILE_DIR):
+        self.size = size
+        self.managers = [DriverManager(f'{name} {slot}', profile_root=profile_root) for slot in range(size)]
+
+    def get(self, slot):
+        """return a healthy driver for a slot, relaunching or recycling it as needed"""
+        return self.managers[slot].acquire()
+
+    def prewarm(self):
+        """launch every slot's driver from background threads; checks that need one meanwhile wait for it"""
+        for manager in self.managers:
+            threading.Thread(target=manager.prewarm, name=f'{manager.name}-prewarm', daemon=True).start()
+
+    def close(self):
+        for manager in self.managers:
+            manager.close()
+        logger.info("chromedriver pool closed")
@@ -0,0 +1,44 @@
+import asyncio
+import time
+
+
+class SingleFlight:
+    """coalesce concurrent calls for the same key onto one in-flight call"""
+
+    def __init__(self):
+        self._inflight = {}
+
+    def inflight(self, key):
+        return key in self._inflight
+
+    async def do(self, key, fn):
+        """await fn() unless a call for key is already running, in which case await that one instead"""
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(fn())
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield so one cancelled waiter doesn't cancel the call for everyone else
+        return await asyncio.shield(future)
+
+
+class PriceCache:
+    """latest observation per key, considered fresh for ttl seconds"""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._entries = {}
+
+    def put(self, key, value):
+        self._entries[key] = (time.monotonic(), value)
+
+    def get(self, key):
+        """return the cached value if it is still fresh, else None"""
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry[0] > self.ttl:
+            return None
+        return entry[1]
+
+    def age(self, key):
+        entry = self._entries.get(key)
+        return None if entry is None else time.monotonic() - entry[0]
@@ -0,0 +1,180 @@
+import asyncio
+import json
+import logging
+import os
+import time
+
+from metrics import EVENT_DELIVERY_SECONDS, EVENT_DROPS, OBSERVATIONS
+
+logger = logging.getLogger(__name__)
+
+# events a subscriber may fall behind by before the stream blocks or drops for it
+EVENT_QUEUE_SIZE = int(os.getenv('EVENT_QUEUE_SIZE', '256'))
+# optional sinks: POST every observation as json to a webhook, append it to a jsonl file
+EVENT_WEBHOOK_URL = os.getenv('EVENT_WEBHOOK_URL')
+EVENT_LOG_FILE = os.getenv('EVENT_LOG_FILE')
+# how long stop() waits for subscribers to work through what is already queued
+EVENT_DRAIN_TIMEOUT = 5
+
+
+class PriceObservation:
+    """one finished check of a product, as published to the event stream"""
+
+    def __init__(self, product, result, source):
+        self.product = product
+        self.result = result
+        # 'scheduled' or 'manual'
+        self.source = source
+        self.price = result.price if result else None
+        self.path = result.path if result else 'error'
+        self.challenge = bool(result and result.challenge)
+        self.latency = result.latency if result else None
+        # product state at publish time, subscribers run later
+        self.target_price = product.target_price
+        self.check_count = product.check_count
+        self.observed_at = time.time()
+        self.published = time.monotonic()
+
+    @property
+    def below_target(self):
+        return self.price is not None and self.price <= self.target_price
+
+    def to_dict(self):
+        return {
+            'url': self.product.url,
+            'name': self.product.name,
+            'source': self.source,
+            'price': self.price,
+            'target': self.target_price,
+            'below_target': self.below_target,
+            'path': self.path,
+            'challenge': self.challenge,
+            'latency': round(self.latency, 3) if self.latency is not None else None,
+            'observed_at': self.observed_at,
+        }
+
+
+class Subscription:
+    def __init__(self, name, handler, maxsize, block):
+        self.name = name
+        self.handler = handler
+        self.block = block
+        self.queue = asyncio.Queue(maxsize)
+        self.task = None
+        self.dropped = 0
+
+
+class EventStream:
+    """fan-out of price observations to independent subscribers
+
+    every subscriber has its own bounded queue and consumer task, so a slow one (a discord
+    send, a webhook) only delays itself. when a queue is full, a blocking subscriber makes
+    publish wait (backpressure back into the scheduler, for things that must not be lost,
+    like history) and a non-blocking one drops its oldest queued event instead.
+    """
+
+    def __init__(self, maxsize=EVENT_QUEUE_SIZE):
+        self.maxsize = maxsize
+        self._subscriptions = []
+        self._running = False
+
+    def subscribe(self, name, handler, block=False, maxsize=None):
+        """call `await handler(observation)` for every published observation"""
+        subscription = Subscription(name, handler, maxsize or self.maxsize, block)
+        self._subscriptions.append(subscription)
+        if self._running:
+            self._start(subscription)
+        return subscription
+
+    def start(self):
+        if not self._running:
+            self._running = True
+            for subscription in self._subscriptions:
+                self._start(subscription)
+
+    async def stop(self, timeout=EVENT_DRAIN_TIMEOUT):
+        """let subscribers finish what is queued (up to timeout), then stop them"""
+        self._running = False
+        queued = [subscription.queue.join() for subscription in self._subscriptions if subscription.task]
+        try:
+            await asyncio.wait_for(asyncio.gather(*queued), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"event subscribers still busy after {timeout}s, dropping what is left")
+        tasks = [subscription.task for subscription in self._subscriptions if subscription.task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for subscription in self._subscriptions:
+            subscription.task = None
+
+    async def publish(self, observation):
+        for subscription in self._subscriptions:
+            queue = subscription.queue
+            if subscription.block:
+                await queue.put(observation)
+                continue
+            if queue.full():
+                queue.get_nowait()
+                queue.task_done()
+                subscription.dropped += 1
+                EVENT_DROPS.inc(subscriber=subscription.name)
+                logger.warning(f"event subscriber {subscription.name} is behind, dropped its oldest event")
+            queue.put_nowait(observation)
+
+    def _start(self, subscription):
+        subscription.task = asyncio.create_task(self._consume(subscription), name=f'events-{subscription.name}')
+
+    async def _consume(self, subscription):
+        while True:
+            observation = await subscription.queue.get()
+            try:
+                await subscription.handler(observation)
+            except Exception as e:
+                logger.error(f"event subscriber {subscription.name} failed on {observation.product.name}: {e}")
+            finally:
+                subscription.queue.task_done()
+            EVENT_DELIVERY_SECONDS.observe(time.monotonic() - observation.published, subscriber=subscription.name)
+
+
+async def count_observation(observation):
+    """metrics subscriber"""
+    OBSERVATIONS.inc(source=observation.source, outcome='price' if observation.price is not None else 'miss')
+
+
+class JsonlFileSink:
+    """appends every observation as one json line"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'a', encoding='utf-8')
+
+    async def __call__(self, observation):
+        self._file.write(json.dumps(observation.to_dict()) + '\n')
+        self._file.flush()
+
+    async def close(self):
+        self._file.close()
+
+
+class WebhookSink:
+    """POSTs every observation as json to a url"""
+
+    def __init__(self, url, timeout=10):
+        self.url = url
+        self.timeout = timeout
+        self._session = None
+
+    async def __call__(self, observation):
+        # aiohttp comes with discord.py
+        import aiohttp
+
+        if self._session is None:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+        async with self._session.post(self.url, json=observation.to_dict()) as response:
+            if response.status >= 400:
+                logger.warning(f"webhook {self.url} answered {response.status}")
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
@@ -0,0 +1,220 @@
+import functools
+import json
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+NEXT_DATA_RE = re.compile(r'<script[^>]*id=["\']__NEXT_DATA__["\'][^>]*>(.*?)</script>', re.S | re.I)
+JSON_LD_RE = re.compile(r'<script[^>]*type=["\']application/ld\+json["\'][^>]*>(.*?)</script>', re.S | re.I)
+ITEMPROP_TAG_RE = re.compile(r'<[a-z]+[^>]*\bitemprop=["\']price["\'][^>]*>([^<]*)', re.I)
+CONTENT_ATTR_RE = re.compile(r'\bcontent=["\']([^"\']+)["\']', re.I)
+TAG_RE = re.compile(r'<[^>]+>')
+
+# markers of bot-challenge / block pages served instead of the product
+CHALLENGE_MARKERS = (
+    'px-captcha',
+    'robot or human',
+    'verify your identity',
+    'press & hold',
+    'access denied',
+)
+CHALLENGE_STATUSES = (403, 429)
+CHALLENGE_URL_PARTS = ('/blocked',)
+# only the top of a page is searched for challenge markers
+CHALLENGE_SCAN_CHARS = 20000
+
+
+class PriceParser:
+    """locale-aware price parser, its patterns compiled once per locale
+
+    handles thousands separators ('$1,299.00', '1.299,00 €' with decimal=',') and cents
+    split into their own element, as in '$144<sup>99</sup>' or '<span>144</span><span>99</span>'.
+    the rendered text is trusted first; the markup is only read when the text has no cents.
+    """
+
+    def __init__(self, decimal='.', thousands=','):
+        self.decimal = decimal
+        self.thousands = thousands
+        d, t = re.escape(decimal), re.escape(thousands)
+        whole = rf'\d{{1,3}}(?:{t}\d{{3}})+|\d+'
+        # at most two decimals, so text run together like '$139.9912' still reads as 139.99
+        self.number_re = re.compile(rf'({whole})(?:{d}(\d{{1,2}}))?')
+        # whole units, then tags, then two digits that are a whole element of their own; the
+        # lookbehind keeps a match from starting inside the cents of an earlier price
+        self.split_cents_re = re.compile(rf'(?<![\d{d}{t}])({whole})\s*(?:<[^>]+>\s*)+(\d{{2}})\s*</', re.I)
+
+    def parse(self, text, markup=None):
+        """first price in text; when that has no cents and markup is given, cents split into
+        their own element of the markup are picked up"""
+        if isinstance(text, (int, float)):
+            return float(text)
+        match = self.number_re.search(str(text)) if text is not None else None
+        if match and match.group(2):
+            return self._number(match.group(1), match.group(2))
+        if markup:
+            split = self.split_cents_re.search(markup)
+            if split:
+                return self._number(split.group(1), split.group(2))
+            if match is None:
+                match = self.number_re.search(TAG_RE.sub(' ', markup))
+        if match:
+            return self._number(match.group(1), match.group(2))
+        return None
+
+    def _number(self, whole, fraction):
+        return float(f"{whole.replace(self.thousands, '')}.{fraction or 0}")
+
+
+US_PARSER = PriceParser()
+
+
+def _find_key(data, key, depth=0):
+    """depth-first search for the first dict containing key"""
+    if depth > 12:
+        return None
+    if isinstance(data, dict):
+        if key in data:
+            return data
+        values = data.values()
+    elif isinstance(data, list):
+        values = data
+    else:
+        return None
+    for value in values:
+        found = _find_key(value, key, depth + 1)
+        if found is not None:
+            return found
+    return None
+
+
+def price_from_next_data(html, plan):
+    """read the current price from the __NEXT_DATA__ json blob"""
+    match = NEXT_DATA_RE.search(html)
+    if not match:
+        return None
+    try:
+        data = json.loads(match.group(1))
+    except ValueError as e:
+        logger.debug(f"bad __NEXT_DATA__ json: {e}")
+        return None
+
+    price_info = None
+    if plan.next_data_path:
+        try:
+            price_info = functools.reduce(lambda node, key: node[key], plan.next_data_path, data)
+        except (KeyError, IndexError, TypeError):
+            pass
+    if not isinstance(price_info, dict):
+        price_info = _find_key(data, 'currentPrice')
+
+    current = (price_info or {}).get('currentPrice')
+    if isinstance(current, dict):
+        return plan.parser.parse(current.get('price'))
+    return None
+
+
+def _ld_offer_price(node, parser):
+    offers = node.get('offers')
+    if isinstance(offers, list):
+        offers = offers[0] if offers else None
+    if not isinstance(offers, dict):
+        return None
+    return parser.parse(offers.get('price', offers.get('lowPrice')))
+
+
+def price_from_json_ld(html, plan):
+    """read the offer price from a schema.org Product in json-ld"""
+    for match in JSON_LD_RE.finditer(html):
+        try:
+            data = json.loads(match.group(1))
+        except ValueError:
+            continue
+        nodes = data if isinstance(data, list) else data.get('@graph', [data]) if isinstance(data, dict) else []
+        for node in nodes:
+            if not isinstance(node, dict):
+                continue
+            node_type = node.get('@type')
+            if node_type == 'Product' or (isinstance(node_type, list) and 'Product' in node_type):
+                price = _ld_offer_price(node, plan.parser)
+                if price is not None:
+                    return price
+    return None
+
+
+def price_from_itemprop(html, plan):
+    """read the price from an itemprop="price" microdata element"""
+    for match in ITEMPROP_TAG_RE.finditer(html):
+        content = CONTENT_ATTR_RE.search(match.group(0))
+        price = plan.parser.parse(content.group(1) if content else match.group(1))
+        if price is not None:
+            return price
+    return None
+
+
+# structured data extractors, cheapest and most reliable first
+EXTRACTORS = {
+    'next_data': price_from_next_data,
+    'json_ld': price_from_json_ld,
+    'itemprop': price_from_itemprop,
+}
+# dom selectors of the markup each extractor reads, for grabbing it from a live page
+STRUCTURED_CSS = {
+    'next_data': '#__NEXT_DATA__',
+    'json_ld': 'script[type="application/ld+json"]',
+    'itemprop': '[itemprop="price"]',
+}
+
+
+class ExtractionPlan:
+    """how to read one retailer's pages, compiled once when the plan is built
+
+    structured names the EXTRACTORS to try in order, next_data_path is the key path to the
+    price info inside __NEXT_DATA__ (searched for when missing), css_selectors and
+    xpath_selectors are the rendered-page fallbacks in priority order, parser reads
+    price text in the retailer's locale, and challenge_markers/statuses/url_parts
+    recognise its bot-challenge pages.
+    """
+
+    def __init__(self, name, structured=tuple(EXTRACTORS), next_data_path=None, css_selectors=(),
+                 xpath_selectors=(), parser=US_PARSER, challenge_markers=CHALLENGE_MARKERS,
+                 challenge_statuses=CHALLENGE_STATUSES, challenge_url_parts=CHALLENGE_URL_PARTS):
+        self.name = name
+        self.next_data_path = tuple(next_data_path or ())
+        self.css_selectors = tuple(css_selectors)
+        self.xpath_selectors = tuple(xpath_selectors)
+        self.selectors = self.css_selectors + self.xpath_selectors
+        self.parser = parser
+        self.challenge_statuses = frozenset(challenge_statuses)
+        self.challenge_url_parts = tuple(challenge_url_parts)
+
+        # compiled forms: bound extractor list, one css selector list, one marker regex
+        self.extractors = tuple((path, EXTRACTORS[path]) for path in structured)
+        self.structured_css = ', '.join(STRUCTURED_CSS[path] for path in structured)
+        self.challenge_re = re.compile('|'.join(map(re.escape, challenge_markers)), re.I) if challenge_markers else None
+
+    def __repr__(self):
+        return f'ExtractionPlan({self.name!r})'
+
+    def extract(self, html):
+        """return (price, path) from embedded structured data, or (None, None)"""
+        for path, extractor in self.extractors:
+            price = extractor(html, self)
+            if price is not None:
+                return price, path
+        return None, None
+
+    def is_challenge(self, html, status_code=200, url=''):
+        if status_code in self.challenge_statuses:
+            return True
+        if any(part in url for part in self.challenge_url_parts):
+            return True
+        return self.challenge_re is not None and self.challenge_re.search(html, 0, CHALLENGE_SCAN_CHARS) is not None
+
+
+# for sites without a plan of their own: every structured extractor and generic selectors
+DEFAULT_PLAN = ExtractionPlan(
+    'generic',
+    css_selectors=("[itemprop='price']", "span[class*='price']", "div[class*='price']"),
+    xpath_selectors=("//*[contains(@class, 'price')]", "//*[contains(text(), '$')]"),
+)
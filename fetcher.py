@@ -0,0 +1,83 @@
+import logging
+import os
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+from browser import USER_AGENT
+from retailers import plan_for
+
+logger = logging.getLogger(__name__)
+
+HTTP_TIMEOUT = float(os.getenv('HTTP_TIMEOUT', '10'))
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', '10'))
+
+DEFAULT_HEADERS = {
+    'User-Agent': USER_AGENT,
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.9',
+}
+
+
+class HttpFetcher:
+    """pooled http client that reads prices from embedded structured data without a browser"""
+
+    def __init__(self, pool_size=HTTP_POOL_SIZE, timeout=HTTP_TIMEOUT):
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update(DEFAULT_HEADERS)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def fetch_price(self, url, timings=None, plan=None):
+        """return (price, path, challenge, bytes transferred); price and path are None on a miss
+
+        the page is read with plan, by default the url's retailer plan.
+        if timings is a dict it is filled with the fetch and parse stage times.
+        """
+        plan = plan or plan_for(url)
+        started = time.monotonic()
+        try:
+            response = self.session.get(url, timeout=self.timeout)
+        except requests.RequestException as e:
+            logger.info(f"http fetch failed for {url}: {e}")
+            return None, None, False, 0
+
+        # compressed size on the wire when the server reports it
+        transferred = int(response.headers.get('Content-Length') or len(response.content))
+        html = response.text
+        parse_started = time.monotonic()
+        if timings is not None:
+            timings['fetch'] = parse_started - started
+        if plan.is_challenge(html, response.status_code, response.url):
+            logger.info(f"http fetch hit a bot challenge for {url} (status {response.status_code})")
+            return None, None, True, transferred
+        if response.status_code != 200:
+            logger.info(f"http fetch got status {response.status_code} for {url}")
+            return None, None, False, transferred
+
+        price, path = plan.extract(html)
+        if timings is not None:
+            timings['parse'] = time.monotonic() - parse_started
+        if price is None:
+            logger.info(f"no structured price data found over http for {url}")
+        return price, path, False, transferred
+
+    def import_cookies(self, cookies):
+        """copy browser cookies (devtools or selenium dicts) into the session, so http fetches
+        carry the same session and challenge clearance as chrome"""
+        for cookie in cookies:
+            expires = cookie.get('expires', cookie.get('expiry'))
+            self.session.cookies.set(
+                cookie['name'], cookie['value'],
+                domain=cookie.get('domain', ''),
+                path=cookie.get('path', '/'),
+                secure=cookie.get('secure', False),
+                # devtools reports session cookies as -1
+                expires=int(expires) if expires and expires > 0 else None,
+            )
+        return len(cookies)
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,125 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+HISTORY_DB = os.getenv('HISTORY_DB', 'price_history.db')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS observations (
+    product_id INTEGER NOT NULL,
+    ts INTEGER NOT NULL,
+    price_cents INTEGER,
+    path TEXT NOT NULL,
+    latency_ms INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS observations_product_ts ON observations (product_id, ts, price_cents);
+"""
+
+
+class PriceHistory:
+    """append-only price observations in sqlite (wal mode), queried with sql aggregates
+
+    timestamps are unix seconds and prices are integer cents, so each row stays a few
+    bytes and every range query is served from the (product_id, ts, price_cents) index.
+    """
+
+    def __init__(self, path=HISTORY_DB):
+        self.path = path
+        self._lock = threading.Lock()
+        self._product_ids = {}
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+
+    def _product_id(self, url):
+        product_id = self._product_ids.get(url)
+        if product_id is None:
+            self.conn.execute('INSERT OR IGNORE INTO products (url) VALUES (?)', (url,))
+            product_id = self.conn.execute('SELECT id FROM products WHERE url = ?', (url,)).fetchone()[0]
+            self._product_ids[url] = product_id
+        return product_id
+
+    def record(self, url, price, path, latency, ts=None):
+        """append one observation; price is None for checks that found nothing"""
+        price_cents = None if price is None else round(price * 100)
+        with self._lock:
+            self.conn.execute(
+                'INSERT INTO observations (product_id, ts, price_cents, path, latency_ms) VALUES (?, ?, ?, ?, ?)',
+                (self._product_id(url), int(ts or time.time()), price_cents, path, round(latency * 1000))
+            )
+
+    def _query(self, sql, params):
+        with self._lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def _window(self, url, days):
+        with self._lock:
+            product_id = self._product_id(url)
+        since = int(time.time() - days * 86400) if days else 0
+        return product_id, since
+
+    def first_seen(self, url):
+        """unix time of the first observation of a product, or None"""
+        product_id, _ = self._window(url, None)
+        row = self._query('SELECT MIN(ts) FROM observations WHERE product_id = ?', (product_id,))
+        return row[0][0]
+
+    def lowest(self, url, days):
+        """(price, ts) of the lowest price seen in the last days, or None"""
+        product_id, since = self._window(url, days)
+        rows = self._query(
+            'SELECT price_cents, ts FROM observations '
+            'WHERE product_id = ? AND ts >= ? AND price_cents IS NOT NULL '
+            'ORDER BY price_cents, ts DESC LIMIT 1',
+            (product_id, since)
+        )
+        return (rows[0][0] / 100, rows[0][1]) if rows else None
+
+    def stats(self, url, days, percentiles=(10, 50, 90)):
+        """count, success rate, min/max/avg, percentiles and mean latency over the last days"""
+        product_id, since = self._window(url, days)
+        (checks, found, low, high, avg, latency), = self._query(
+            'SELECT COUNT(*), COUNT(price_cents), MIN(price_cents), MAX(price_cents), AVG(price_cents), AVG(latency_ms) '
+            'FROM observations WHERE product_id = ? AND ts >= ?',
+            (product_id, since)
+        )
+        stats = {'checks': checks, 'found': found}
+        if not found:
+            return stats
+
+        stats.update(min=low / 100, max=high / 100, avg=avg / 100, latency_ms=latency)
+        for p in percentiles:
+            # nearest-rank percentile, sorted by sqlite rather than in python
+            offset = round(p / 100 * (found - 1))
+            (value,), = self._query(
+                'SELECT price_cents FROM observations '
+                'WHERE product_id = ? AND ts >= ? AND price_cents IS NOT NULL '
+                'ORDER BY price_cents LIMIT 1 OFFSET ?',
+                (product_id, since, offset)
+            )
+            stats[f'p{p}'] = value / 100
+        return stats
+
+    def daily(self, url, days):
+        """[(day_start_ts, min, max, checks)] per utc day over the last days, oldest first"""
+        product_id, since = self._window(url, days)
+        rows = self._query(
+            'SELECT ts / 86400 * 86400 AS day, MIN(price_cents), MAX(price_cents), COUNT(*) '
+            'FROM observations WHERE product_id = ? AND ts >= ? AND price_cents IS NOT NULL '
+            'GROUP BY day ORDER BY day',
+            (product_id, since)
+        )
+        return [(day, low / 100, high / 100, count) for day, low, high, count in rows]
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
@@ -0,0 +1,252 @@
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# local prometheus endpoint, set METRICS_PORT=0 to turn it off
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9108'))
+
+# seconds, from a cached http parse up to a slow chrome navigation
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _label_text(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{value}"' for name, value in zip(names, values))
+    return f'{{{pairs}}}'
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, value=1, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def values(self):
+        with self._lock:
+            return dict(self._values)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        for key, value in sorted(self.values().items()):
+            lines.append(f'{self.name}{_label_text(self.labels, key)} {value}')
+        return lines
+
+
+class Gauge:
+    """gauge read from a callback at scrape time, or set directly; unset gauges render no sample"""
+
+    def __init__(self, name, help, read=None):
+        self.name = name
+        self.help = help
+        self.read = read
+        self.value = None
+
+    def set(self, value):
+        self.value = value
+
+    def get(self):
+        return self.read() if self.read is not None else self.value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} gauge']
+        try:
+            value = self.get()
+        except Exception as e:
+            logger.debug(f"error reading gauge {self.name}: {e}")
+            value = None
+        if value is not None:
+            lines.append(f'{self.name} {value}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            else:
+                series[len(self.buckets)] += 1
+            series[-1] += value
+
+    def summary(self):
+        """{label values: (count, mean, approximate p95)}"""
+        with self._lock:
+            snapshot = {key: list(series) for key, series in self._series.items()}
+        summary = {}
+        for key, series in snapshot.items():
+            counts = series[:-1]
+            count = sum(counts)
+            if not count:
+                continue
+            rank = 0.95 * count
+            seen = 0
+            p95 = float('inf')
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                seen += bucket_count
+                if seen >= rank:
+                    p95 = bound
+                    break
+            summary[key] = (count, series[-1] / count, p95)
+        return summary
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            snapshot = {key: list(series) for key, series in self._series.items()}
+        for key, series in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series[:-1]):
+                cumulative += count
+                labels = _label_text(self.labels + ('le',), key + (bound,))
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _label_text(self.labels, key)
+            lines.append(f'{self.name}_sum{labels} {series[-1]}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+CHECK_STAGE_SECONDS = REGISTRY.register(Histogram(
+    'price_check_stage_seconds', 'Time spent in each stage of a price check', ('stage',)))
+CHECKS = REGISTRY.register(Counter(
+    'price_checks_total', 'Price checks by the extraction path that ended them', ('path',)))
+CHALLENGES = REGISTRY.register(Counter(
+    'price_challenges_total', 'Checks that hit a bot-challenge page'))
+DRIVER_RESTARTS = REGISTRY.register(Counter(
+    'driver_restarts_total', 'Chromedriver relaunches after a failed liveness probe or a recycle'))
+WORKER_RESTARTS = REGISTRY.register(Counter(
+    'scrape_worker_restarts_total', 'Scrape worker processes restarted after dying or hanging'))
+DISCORD_SEND_SECONDS = REGISTRY.register(Histogram(
+    'discord_send_seconds', 'Time to send one discord message', ('kind',)))
+QUEUE_DEPTH = REGISTRY.register(Gauge(
+    'scheduler_queue_depth', 'Products waiting in the scheduler queue'))
+OBSERVATIONS = REGISTRY.register(Counter(
+    'price_observations_total', 'Finished checks published to subscribers', ('source', 'outcome')))
+EVENT_DROPS = REGISTRY.register(Counter(
+    'event_drops_total', 'Observations dropped for subscribers that fell behind', ('subscriber',)))
+EVENT_DELIVERY_SECONDS = REGISTRY.register(Histogram(
+    'event_delivery_seconds', 'Time from publishing an observation until a subscriber handled it', ('subscriber',)))
+READY_SECONDS = REGISTRY.register(Gauge(
+    'bot_ready_seconds', 'Seconds from process start until the bot first connected and could take commands'))
+FIRST_COMMAND_SECONDS = REGISTRY.register(Gauge(
+    'bot_first_command_seconds', 'Seconds to ready plus the first command handler, the startup cost of an answer'))
+COMMAND_SECONDS = REGISTRY.register(Histogram(
+    'bot_command_seconds', 'Time from receiving a command message until its handler finished', ('command',)))
+
+
+class CheckTrace:
+    """spans of one price check: each span is observed into the stage histogram and the
+    whole check is logged as one structured json line when it finishes"""
+
+    def __init__(self, url):
+        self.url = url
+        self.spans = {}
+        self.started = time.monotonic()
+
+    def add(self, stage, seconds):
+        self.spans[stage] = self.spans.get(stage, 0.0) + seconds
+        CHECK_STAGE_SECONDS.observe(seconds, stage=stage)
+
+    def add_all(self, timings):
+        for stage, seconds in timings.items():
+            self.add(stage, seconds)
+
+    @contextmanager
+    def span(self, stage):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add(stage, time.monotonic() - started)
+
+    def finish(self, result):
+        CHECKS.inc(path=result.path)
+        if result.challenge:
+            CHALLENGES.inc()
+        logger.info("check " + json.dumps({
+            'url': self.url,
+            'path': result.path,
+            'price': result.price,
+            'challenge': result.challenge,
+            'total': round(time.monotonic() - self.started, 4),
+            'spans': {stage: round(seconds, 4) for stage, seconds in self.spans.items()},
+        }))
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server = None
+
+
+def start_metrics_server(host=METRICS_HOST, port=METRICS_PORT):
+    """serve the registry in prometheus text format from a background thread (once per process)"""
+    global _server
+    if _server is not None or not port:
+        return _server
+    try:
+        _server = ThreadingHTTPServer((host, port), MetricsHandler)
+    except OSError as e:
+        logger.error(f"could not start metrics endpoint on {host}:{port}: {e}")
+        return None
+    threading.Thread(target=_server.serve_forever, name='metrics', daemon=True).start()
+    logger.info(f"metrics endpoint listening on http://{host}:{port}/metrics")
+    return _server
@@ -0,0 +1,128 @@
+import asyncio
+import itertools
+import logging
+import os
+import time
+from collections import deque
+import discord
+
+from metrics import DISCORD_SEND_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# per-channel send budget, kept under discord's limit of 5 messages per 5 seconds
+CHANNEL_RATE = int(os.getenv('CHANNEL_RATE', '5'))
+CHANNEL_PER = float(os.getenv('CHANNEL_PER', '5.5'))
+# how often batched status lines are flushed into combined embeds
+STATUS_FLUSH_INTERVAL = float(os.getenv('STATUS_FLUSH_INTERVAL', '60'))
+
+PRIORITY_ALERT = 0
+PRIORITY_NORMAL = 1
+PRIORITY_STATUS = 2
+PRIORITY_NAMES = {PRIORITY_ALERT: 'alert', PRIORITY_NORMAL: 'message', PRIORITY_STATUS: 'status'}
+
+# discord caps an embed at 25 fields and a message at 10 embeds
+MAX_FIELDS = 25
+MAX_EMBEDS = 10
+
+
+class DiscordOutbox:
+    """single async outbound queue for channel messages
+
+    alerts are deduplicated on (product, price state) transitions, status lines from
+    many products are batched into combined embeds, every send respects a per-channel
+    rate limit and queued alerts always go out before queued status updates.
+    """
+
+    def __init__(self, bot, rate=CHANNEL_RATE, per=CHANNEL_PER, status_flush=STATUS_FLUSH_INTERVAL):
+        self.bot = bot
+        self.rate = rate
+        self.per = per
+        self.status_flush = status_flush
+        self._queue = asyncio.PriorityQueue()
+        self._seq = itertools.count()
+        self._sent = {}
+        self._states = {}
+        self._status_lines = {}
+        self._tasks = []
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._sender()), asyncio.create_task(self._status_flusher())]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def transition(self, key, state):
+        """record the latest state for key and return True only if it changed"""
+        previous = self._states.get(key)
+        self._states[key] = state
+        return previous != state
+
+    def reset(self, key):
+        """forget key's state so the next observation counts as a transition"""
+        self._states.pop(key, None)
+
+    def alert(self, channel_id, **message):
+        """queue a message ahead of everything else"""
+        self._put(PRIORITY_ALERT, channel_id, message)
+
+    def send(self, channel_id, **message):
+        self._put(PRIORITY_NORMAL, channel_id, message)
+
+    def status(self, channel_id, name, value):
+        """add a status line, sent with the others on the next flush; a newer line for the same name replaces the old one"""
+        self._status_lines.setdefault(channel_id, {})[name] = value
+
+    async def flush_status(self):
+        lines, self._status_lines = self._status_lines, {}
+        for channel_id, fields in lines.items():
+            fields = list(fields.items())
+            embeds = []
+            for start in range(0, len(fields), MAX_FIELDS):
+                embed = discord.Embed(
+                    title="📊 Price Check Status" if not embeds else None,
+                    color=0x0099ff
+                )
+                for name, value in fields[start:start + MAX_FIELDS]:
+                    embed.add_field(name=name[:256], value=value[:1024], inline=False)
+                embeds.append(embed)
+            for start in range(0, len(embeds), MAX_EMBEDS):
+                self._put(PRIORITY_STATUS, channel_id, {'embeds': embeds[start:start + MAX_EMBEDS]})
+            logger.info(f"batched {len(fields)} status updates into {len(embeds)} embeds")
+
+    def _put(self, priority, channel_id, message):
+        self._queue.put_nowait((priority, next(self._seq), channel_id, message))
+
+    async def _wait_for_budget(self, channel_id):
+        sent = self._sent.setdefault(channel_id, deque())
+        now = time.monotonic()
+        while sent and now - sent[0] > self.per:
+            sent.popleft()
+        if len(sent) >= self.rate:
+            await asyncio.sleep(self.per - (now - sent[0]))
+            sent.popleft()
+        sent.append(time.monotonic())
+
+    async def _sender(self):
+        while True:
+            priority, _, channel_id, message = await self._queue.get()
+            channel = self.bot.get_channel(channel_id)
+            if channel is None:
+                logger.warning(f"dropping message for unknown channel {channel_id}")
+                continue
+            await self._wait_for_budget(channel_id)
+            started = time.monotonic()
+            try:
+                await channel.send(**message)
+                DISCORD_SEND_SECONDS.observe(time.monotonic() - started, kind=PRIORITY_NAMES[priority])
+            except Exception as e:
+                logger.error(f"error sending discord message (priority {priority}): {e}")
+
+    async def _status_flusher(self):
+        while True:
+            await asyncio.sleep(self.status_flush)
+            await self.flush_status()
@@ -0,0 +1,135 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import random
+import time
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+# minimum spacing between two checks against the same host, plus up to HOST_JITTER extra
+HOST_MIN_GAP = float(os.getenv('HOST_MIN_GAP', '3'))
+HOST_JITTER = float(os.getenv('HOST_JITTER', '2'))
+# the gap doubles per consecutive challenge page from a host, up to this many seconds
+HOST_MAX_GAP = float(os.getenv('HOST_MAX_GAP', '300'))
+# checks of one host that may start per gap; 0 means one per worker process (one in thread mode)
+HOST_CONCURRENCY = int(os.getenv('HOST_CONCURRENCY', '0'))
+
+# bounds for a product's adaptive check interval, in seconds
+MIN_INTERVAL = int(os.getenv('MIN_INTERVAL', '120'))
+MAX_INTERVAL = int(os.getenv('MAX_INTERVAL', '21600'))
+# poll twice as often within this fraction above target, or for a day after the price moved
+NEAR_TARGET = float(os.getenv('NEAR_TARGET', '0.05'))
+RECENT_CHANGE = 86400
+# poll less often once the price hasn't moved for this long
+STABLE_AFTER = 3 * 86400
+
+
+class HostBudget:
+    """per-host politeness budget: spaces checks of the same host with jittered gaps
+    and widens the gap while the host keeps serving challenge pages
+
+    `concurrency` checks of a host may start per gap, so the budget can grow with the
+    number of worker processes. waiters take turns in order, with priority (manual)
+    waiters ahead of every scheduled one, and a turn is only granted once the host's
+    next slot is due, so a manual check never waits behind queued scheduled checks.
+    """
+
+    def __init__(self, min_gap=HOST_MIN_GAP, jitter=HOST_JITTER, max_gap=HOST_MAX_GAP, concurrency=1):
+        self.min_gap = min_gap
+        self.jitter = jitter
+        self.max_gap = max_gap
+        self.concurrency = max(1, concurrency)
+        self._next_slot = {}
+        self._challenges = {}
+        self._waiting = {}
+        self._wakeups = {}
+        self._seq = itertools.count()
+
+    def gap(self, host):
+        return min(self.min_gap * 2 ** self._challenges.get(host, 0), self.max_gap)
+
+    async def acquire(self, url, priority=False):
+        """wait for this host's next free slot; priority waiters go first"""
+        host = urlsplit(url).hostname
+        turn = (0 if priority else 1, next(self._seq))
+        waiting = self._waiting.setdefault(host, [])
+        wakeup = self._wakeups.setdefault(host, asyncio.Condition())
+        heapq.heappush(waiting, turn)
+        try:
+            async with wakeup:
+                while True:
+                    delay = self._next_slot.get(host, 0) - time.monotonic()
+                    if waiting[0] == turn and delay <= 0:
+                        break
+                    # the first in line sleeps until the slot, everyone else until the line moves
+                    try:
+                        await asyncio.wait_for(wakeup.wait(), delay if waiting[0] == turn else None)
+                    except asyncio.TimeoutError:
+                        pass
+                spacing = (self.gap(host) + random.uniform(0, self.jitter)) / self.concurrency
+                self._next_slot[host] = time.monotonic() + spacing
+        finally:
+            waiting.remove(turn)
+            heapq.heapify(waiting)
+            async with wakeup:
+                wakeup.notify_all()
+
+    def report(self, url, challenge):
+        host = urlsplit(url).hostname
+        if challenge:
+            self._challenges[host] = self._challenges.get(host, 0) + 1
+            logger.warning(f"challenge page from {host}, spacing checks {self.gap(host):.0f}s apart")
+        else:
+            self._challenges.pop(host, None)
+
+
+class AdaptiveInterval:
+    """picks the delay until a product's next check from its recent results
+
+    failed checks back off exponentially from the product's interval,
+    prices that recently moved or sit near the target are polled faster, and
+    prices that have been stable for days are polled slower.
+    """
+
+    def __init__(self, min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL, near_target=NEAR_TARGET):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.near_target = near_target
+
+    def next_delay(self, product, result):
+        now = time.time()
+        price = result.price if result else None
+
+        if price is None:
+            product.failures += 1
+            delay = self._clamp(product.interval * 2 ** min(product.failures, 6), floor=product.interval)
+            logger.info(f"{product.name}: {product.failures} failed checks in a row, backing off to {delay:.0f}s")
+            return delay
+
+        product.failures = 0
+        if product.observed_since is None:
+            product.observed_since = now
+        if product.last_price is not None and price != product.last_price:
+            product.changed_at = now
+
+        factor = 1.0
+        # how long the price has held, as far as this process has seen
+        since_change = now - (product.changed_at or product.observed_since)
+        if price <= product.target_price * (1 + self.near_target):
+            factor = 0.5
+        elif product.changed_at is not None and since_change < RECENT_CHANGE:
+            factor = 0.5
+        elif since_change > 2 * STABLE_AFTER:
+            factor = 4.0
+        elif since_change > STABLE_AFTER:
+            factor = 2.0
+
+        return self._clamp(product.interval * factor)
+
+    def _clamp(self, delay, floor=None):
+        delay = min(max(delay, floor or self.min_interval), self.max_interval)
+        # spread products that share an interval so they don't all come due together
+        return delay * random.uniform(0.9, 1.1)
@@ -0,0 +1,86 @@
+import importlib
+import logging
+import os
+from urllib.parse import urlsplit
+
+from extract import DEFAULT_PLAN, ExtractionPlan
+
+logger = logging.getLogger(__name__)
+
+# extra modules to import at startup, each calling register() for its stores
+RETAILER_PLUGINS = [m.strip() for m in os.getenv('RETAILER_PLUGINS', '').split(',') if m.strip()]
+
+_plans_by_host = {}
+_plans_by_name = {}
+# every hostname looked up so far, resolved to its plan
+_resolved = {}
+
+
+def register(plan, *hosts):
+    """make plan the extraction plan for the given hostnames and their subdomains"""
+    for host in hosts:
+        _plans_by_host[host.lower()] = plan
+    _plans_by_name[plan.name] = plan
+    _resolved.clear()
+    return plan
+
+
+def plan_named(name):
+    return _plans_by_name.get(name)
+
+
+def plan_for(url):
+    """the plan registered for url's host or its closest registered parent domain, else the default"""
+    host = (urlsplit(url).hostname or '').lower()
+    plan = _resolved.get(host)
+    if plan is None:
+        # www.walmart.com, then walmart.com, then com; resolved once per host
+        parts = host.split('.')
+        plan = DEFAULT_PLAN
+        for i in range(len(parts)):
+            domain = '.'.join(parts[i:])
+            if domain in _plans_by_host:
+                plan = _plans_by_host[domain]
+                break
+        _resolved[host] = plan
+    return plan
+
+
+def load_plugins(modules=RETAILER_PLUGINS):
+    for module in modules:
+        try:
+            importlib.import_module(module)
+            logger.info(f"loaded retailer plugin {module}")
+        except Exception as e:
+            logger.error(f"could not load retailer plugin {module}: {e}")
+
+
+WALMART = register(ExtractionPlan(
+    'walmart',
+    next_data_path=('props', 'pageProps', 'initialData', 'data', 'product', 'priceInfo'),
+    css_selectors=(
+        "span[data-automation-id='product-price']",
+        "span.price-characteristic",
+        "div[data-testid='price-wrap']",
+        "span[itemprop='price']",
+        "div.inline-flex span[aria-hidden='true']",
+        "span.b.lh-copy.dark-gray.f2.mr1",
+        "div[data-testid='list-price']",
+        "div[data-testid='price-styling']",
+        "div[data-item-id='price']",
+        "div.price-display",
+        "span[class*='price']",
+        "div[class*='price']",
+        "span[data-testid='price-currency']",
+        "div[data-testid='price-current']",
+        "span.price-group",
+    ),
+    xpath_selectors=(
+        "//*[contains(@class, 'price')]",
+        "//*[contains(text(), '$')]",
+        "//*[@data-automation-id='product-price']",
+        "//span[@class='price-characteristic']",
+    ),
+), 'walmart.com')
+
+load_plugins()
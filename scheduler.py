@@ -0,0 +1,200 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from coalesce import SingleFlight
+from metrics import QUEUE_DEPTH, CheckTrace
+from pacing import AdaptiveInterval, HostBudget
+
+logger = logging.getLogger(__name__)
+
+
+class ScrapeScheduler:
+    """priority queue of products keyed on next-due time, drained by a bounded pool of browser workers
+
+    scrape(worker_id, product, trace) runs in a worker thread and returns a result;
+    trace is the check's CheckTrace, already holding its queue_wait and host_wait spans.
+    each worker_id is only ever used by one thread at a time, so it can own a driver.
+    on_result(product, result, source) is awaited on the event loop exactly once per
+    scrape, with source 'scheduled' or 'manual'; result is None if scrape raised.
+    scheduled checks are rescheduled before on_result sees them.
+
+    manual requests and scheduled checks for the same product are coalesced, so a
+    product is never scraped twice at once and callers share the in-flight result.
+
+    every check first waits for its host's politeness budget, manual ones ahead of
+    scheduled ones, and the delay until a product's next check comes from the adaptive
+    interval policy.
+    """
+
+    def __init__(self, watchlist, scrape, on_result, workers=2, policy=None, budget=None):
+        self.watchlist = watchlist
+        self.scrape = scrape
+        self.on_result = on_result
+        self.workers = workers
+        self.policy = policy or AdaptiveInterval()
+        self.budget = budget or HostBudget()
+        self._heap = []
+        self._seq = itertools.count()
+        self._manual = deque()
+        self._cond = None
+        self._tasks = []
+        # scheduled checks run as their own tasks so manual requests can join them
+        self._checks = set()
+        self._running = False
+        self._executor = None
+        self._idle_lock = asyncio.Lock()
+        self._flights = SingleFlight()
+
+    def is_running(self):
+        return bool(self._tasks)
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._cond = asyncio.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='scrape')
+        self._heap.clear()
+        for product in self.watchlist:
+            self._push(product, 0)
+        self._running = True
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        QUEUE_DEPTH.read = lambda: len(self._heap)
+        logger.info(f"scheduler started with {self.workers} workers for {len(self.watchlist)} products")
+
+    async def stop(self):
+        self._running = False
+        # the scheduled checks too: they are shielded from their cancelled workers
+        tasks = self._tasks + list(self._checks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = []
+        while self._manual:
+            _, future, _ = self._manual.popleft()
+            if not future.done():
+                future.cancel()
+        if self._executor:
+            # cancelling a worker doesn't stop its scrape thread, so wait for those to finish
+            # before the idle path is let onto worker 0's driver
+            async with self._idle_lock:
+                await asyncio.to_thread(self._executor.shutdown, wait=True)
+                self._executor = None
+        logger.info("scheduler stopped")
+
+    async def schedule(self, product, delay=0):
+        """(re)schedule a product to be checked after delay seconds"""
+        self._push(product, delay)
+        await self._notify()
+
+    async def request(self, product):
+        """check a product ahead of the queue and return its result, joining any check already in flight"""
+        return await self._flights.do(product.url, lambda: self._request(product))
+
+    async def _request(self, product):
+        if not self._tasks:
+            # no workers while stopped, so worker 0's driver is free to use directly
+            async with self._idle_lock:
+                return await self._check(0, product, time.monotonic(), 'manual')
+
+        future = asyncio.get_running_loop().create_future()
+        self._manual.append((product, future, time.monotonic()))
+        await self._notify()
+        return await future
+
+    def next_check_in(self, product):
+        if product.next_due is None:
+            return None
+        return max(0.0, product.next_due - time.monotonic())
+
+    def _push(self, product, delay):
+        product.next_due = time.monotonic() + delay
+        heapq.heappush(self._heap, (product.next_due, next(self._seq), product.url))
+
+    async def _notify(self):
+        if self._cond is None:
+            return
+        async with self._cond:
+            self._cond.notify()
+
+    async def _next_job(self):
+        async with self._cond:
+            while True:
+                if self._manual:
+                    return self._manual.popleft()
+
+                now = time.monotonic()
+                if self._heap and self._heap[0][0] <= now:
+                    due, _, url = heapq.heappop(self._heap)
+                    product = self.watchlist.get(url)
+                    # skip products that were removed or rescheduled since this entry was pushed
+                    if product is None or product.next_due != due:
+                        continue
+                    return product, None, due
+
+                timeout = self._heap[0][0] - now if self._heap else None
+                try:
+                    await asyncio.wait_for(self._cond.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _scrape(self, worker_id, product, ready_at, source):
+        trace = CheckTrace(product.url)
+        trace.add('queue_wait', max(0.0, time.monotonic() - ready_at))
+        with trace.span('host_wait'):
+            await self.budget.acquire(product.url, priority=source == 'manual')
+        if source == 'scheduled' and not self._running:
+            # the idle path may be using worker 0's driver by now
+            raise asyncio.CancelledError
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(self._executor, self.scrape, worker_id, product, trace)
+        except Exception as e:
+            logger.error(f"worker {worker_id} failed checking {product.name}: {e}")
+            return None
+        self.budget.report(product.url, getattr(result, 'challenge', False))
+        return result
+
+    async def _check(self, worker_id, product, ready_at, source):
+        result = await self._scrape(worker_id, product, ready_at, source)
+        if source == 'scheduled':
+            await self.schedule(product, self.policy.next_delay(product, result))
+        await self._deliver(product, result, source)
+        return result
+
+    async def _deliver(self, product, result, source):
+        try:
+            await self.on_result(product, result, source)
+        except Exception as e:
+            logger.error(f"error handling result for {product.name}: {e}")
+
+    def _track(self, check):
+        task = asyncio.create_task(check)
+        self._checks.add(task)
+        task.add_done_callback(self._checks.discard)
+        return task
+
+    async def _worker(self, worker_id):
+        while True:
+            product, future, ready_at = await self._next_job()
+
+            if future is not None:
+                # manual request, already registered as the in-flight call for this product
+                try:
+                    result = await self._check(worker_id, product, ready_at, 'manual')
+                except asyncio.CancelledError:
+                    # stopped mid-check: cancel the request rather than leave its flight open
+                    future.cancel()
+                    raise
+                if not future.done():
+                    future.set_result(result)
+                continue
+
+            joined = self._flights.inflight(product.url)
+            result = await self._flights.do(product.url, lambda: self._track(self._check(worker_id, product, ready_at, 'scheduled')))
+            if joined:
+                # shared a manual check's result, which that check already delivered
+                await self.schedule(product, self.policy.next_delay(product, result))
@@ -0,0 +1,296 @@
+import logging
+import os
+import threading
+import time
+
+from browser import browser_cookies
+from fetcher import HttpFetcher
+from metrics import CheckTrace
+from retailers import plan_for
+from screenshots import ScreenshotRing
+
+logger = logging.getLogger(__name__)
+
+# copy chrome's cookies into the http session after each chrome check, so a challenge chrome
+# got through doesn't have to be solved again by the next http fetch
+SHARE_COOKIES = os.getenv('SHARE_COOKIES', '1') == '1'
+
+# every path a check can end on, in the order they are tried
+EXTRACTION_PATHS = ('next_data', 'json_ld', 'itemprop', 'chrome', 'miss')
+
+
+class ScrapeResult:
+    """outcome of one price check: the price (or None), how it was found and how long it took"""
+
+    def __init__(self, price, path, latency, challenge=False, transferred=0, time_to_price=None):
+        self.price = price
+        self.path = path
+        self.latency = latency
+        self.challenge = challenge
+        # bytes downloaded and seconds from request start to price, for the path that found it
+        self.transferred = transferred
+        self.time_to_price = time_to_price
+
+
+class ExtractionStats:
+    """thread-safe hit counts, bytes transferred and time-to-price per extraction path"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = dict.fromkeys(EXTRACTION_PATHS, 0)
+        self.transferred = dict.fromkeys(EXTRACTION_PATHS, 0)
+        self.time_to_price = dict.fromkeys(EXTRACTION_PATHS, 0.0)
+        self.challenges = 0
+        self.total = 0
+
+    def record(self, result):
+        with self._lock:
+            self.total += 1
+            self.hits[result.path] = self.hits.get(result.path, 0) + 1
+            self.transferred[result.path] = self.transferred.get(result.path, 0) + result.transferred
+            if result.time_to_price is not None:
+                self.time_to_price[result.path] = self.time_to_price.get(result.path, 0.0) + result.time_to_price
+            if result.challenge:
+                self.challenges += 1
+
+    def averages(self, path):
+        """(mean bytes transferred, mean seconds to price) per check on a path"""
+        with self._lock:
+            hits = self.hits.get(path, 0)
+            if not hits:
+                return 0, None
+            return self.transferred[path] / hits, self.time_to_price[path] / hits
+
+    def hit_rates(self):
+        with self._lock:
+            return {path: count / self.total for path, count in self.hits.items()} if self.total else {}
+
+    def summary(self):
+        rates = self.hit_rates()
+        if not rates:
+            return "no checks yet"
+        parts = []
+        for path, rate in rates.items():
+            if not self.hits[path]:
+                continue
+            transferred, time_to_price = self.averages(path)
+            detail = f"{transferred / 1024:.0f} KB"
+            if path != 'miss':
+                detail += f", {time_to_price:.1f}s"
+            parts.append(f"{path} {rate:.0%} ({detail})")
+        return f"{', '.join(parts)} of {self.total} checks, {self.challenges} challenged"
+
+
+class PriceScraper:
+    """extraction engine: browserless http fetch first, chrome only as a fallback"""
+
+    def __init__(self, drivers, fetcher=None):
+        self.drivers = drivers
+        self.fetcher = fetcher or HttpFetcher()
+        self.stats = ExtractionStats()
+        # one adaptive selector ranking per retailer plan
+        self.selector_orders = {}
+        self.screenshots = ScreenshotRing()
+
+    def check(self, slot, url, trace=None):
+        """check one url, using the chrome driver in the given slot only if the http path misses"""
+        trace = trace or CheckTrace(url)
+        started = time.monotonic()
+        timings = {}
+        plan = plan_for(url)
+        price, path, challenge, transferred = self.fetcher.fetch_price(url, timings, plan)
+        trace.add_all({f'http_{stage}': seconds for stage, seconds in timings.items()})
+        time_to_price = time.monotonic() - started
+        if price is not None:
+            logger.info(f"extracted price via {path} over http: ${price}")
+        else:
+            reason = "bot challenge" if challenge else "no structured data"
+            logger.info(f"falling back to chromedriver ({reason})")
+            with trace.span('driver_acquire'):
+                driver = self.drivers.get(slot)
+            timings = {}
+            order = self.selector_orders.get(plan.name)
+            if order is None:
+                order = self.selector_orders[plan.name] = SelectorOrder(plan.selectors)
+            price, chrome_transferred, time_to_price = get_chrome_price(driver, url, order, timings, self.screenshots, plan)
+            trace.add_all(timings)
+            if driver is not None and SHARE_COOKIES:
+                with trace.span('cookie_share'):
+                    self.share_cookies(driver)
+            transferred += chrome_transferred
+            path = 'chrome' if price is not None else 'miss'
+
+        result = ScrapeResult(price, path, time.monotonic() - started, challenge, transferred, time_to_price)
+        self.stats.record(result)
+        trace.finish(result)
+        return result
+
+    def share_cookies(self, driver):
+        try:
+            count = self.fetcher.import_cookies(browser_cookies(driver))
+            logger.debug(f"shared {count} chrome cookies with the http session")
+        except Exception as e:
+            logger.debug(f"could not share chrome cookies: {e}")
+
+    def prewarm(self):
+        """start launching chrome in the background so the first fallback doesn't pay for it"""
+        self.drivers.prewarm()
+
+    def close(self):
+        self.fetcher.close()
+        self.drivers.close()
+
+
+# evaluates every candidate selector in the page in one round trip and returns
+# {matches: [[selector, text, markup], ...], structured: <structured data markup>, transferred: <bytes>}.
+# the markup (capped) is what lets the parser see cents split into their own element
+FIND_PRICES_JS = """
+const [css, xpaths, structuredCss] = arguments;
+const found = [];
+const add = (selector, el) => {
+    const text = el ? (el.innerText || el.textContent || '').trim() : '';
+    if (text) found.push([selector, text, el.innerHTML.slice(0, 2000)]);
+};
+for (const selector of css) {
+    let el = null;
+    try { el = document.querySelector(selector); } catch (e) { continue; }
+    add(selector, el);
+}
+for (const xpath of xpaths) {
+    let el = null;
+    try {
+        el = document.evaluate(xpath, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+    } catch (e) { continue; }
+    add(xpath, el);
+}
+const structured = structuredCss ? Array.from(
+    document.querySelectorAll(structuredCss),
+    (el) => el.outerHTML
+).join('') : '';
+const nav = performance.getEntriesByType('navigation')[0];
+let transferred = nav ? nav.transferSize : 0;
+for (const entry of performance.getEntriesByType('resource')) transferred += entry.transferSize || 0;
+return {matches: found, structured: structured, transferred: transferred};
+"""
+
+# how long to wait for the price to show up after navigation starts, and how often to look
+PRICE_READY_TIMEOUT = 15
+PRICE_POLL_INTERVAL = 0.25
+
+
+class SelectorOrder:
+    """adaptive selector ordering: the selector that last won for a product is tried first,
+    then selectors that have won most often across all products"""
+
+    def __init__(self, selectors):
+        self.selectors = tuple(selectors)
+        self._lock = threading.Lock()
+        self._last_winner = {}
+        self._wins = dict.fromkeys(self.selectors, 0)
+
+    def ranked(self, url):
+        with self._lock:
+            ranked = sorted(self.selectors, key=lambda selector: -self._wins[selector])
+            winner = self._last_winner.get(url)
+        if winner is not None:
+            ranked.remove(winner)
+            ranked.insert(0, winner)
+        return ranked
+
+    def record_win(self, url, selector):
+        with self._lock:
+            self._last_winner[url] = selector
+            self._wins[selector] += 1
+
+
+def record_stage(timings, stage, started):
+    """store the seconds since started under stage if timings is a dict, and return the current time"""
+    now = time.monotonic()
+    if timings is not None:
+        timings[stage] = now - started
+    return now
+
+
+def read_price(page, plan, order, url):
+    """(price, structured path, selector) from one FIND_PRICES_JS result, or (None, None, None)
+
+    structured data wins, then the selector matches in order's ranking for url.
+    """
+    price, path = plan.extract(page.get('structured') or '')
+    if price is not None:
+        return price, path, None
+    matches = {match[0]: match[1:] for match in page.get('matches') or []}
+    for selector in order.ranked(url):
+        match = matches.get(selector)
+        if match is None:
+            continue
+        price_text, markup = match
+        price = plan.parser.parse(price_text, markup)
+        if price is not None:
+            return price, None, selector
+        logger.debug(f"selector '{selector}' matched unparseable text: {price_text!r}")
+    return None, None, None
+
+
+def get_chrome_price(driver, url, order, timings=None, screenshots=None, plan=None):
+    """get current price for a product page using an undetected chromedriver
+
+    the page is read with plan (by default the url's retailer plan), and order must be a
+    SelectorOrder over that plan's selectors.
+    returns (price, bytes transferred, seconds from navigation start to price).
+    if timings is a dict it is filled with the navigation, selector_search and parse stage times.
+    if screenshots is a ScreenshotRing, a page that yields no price is captured into it.
+    """
+    if not driver:
+        logger.error("chromedriver not available")
+        return None, 0, None
+
+    plan = plan or plan_for(url)
+    try:
+        logger.info(f"loading product page with undetected chromedriver: {url}")
+
+        started = time.monotonic()
+        driver.get(url)
+
+        # search the page until a price actually parses, since a client-rendered price can
+        # land well after its containers and script tags exist, then stop loading the rest
+        while True:
+            search_started = time.monotonic()
+            page = driver.execute_script(FIND_PRICES_JS, list(plan.css_selectors), list(plan.xpath_selectors), plan.structured_css) or {}
+            parse_started = time.monotonic()
+            price, path, selector = read_price(page, plan, order, url)
+            if price is not None:
+                break
+            if parse_started - started >= PRICE_READY_TIMEOUT:
+                logger.info(f"no price after {PRICE_READY_TIMEOUT}s, giving up on the page as loaded")
+                break
+            time.sleep(PRICE_POLL_INTERVAL)
+        driver.execute_script('window.stop()')
+        transferred = page.get('transferred') or 0
+
+        # the wait for the last search counts as navigation
+        if timings is not None:
+            timings['navigation'] = search_started - started
+            timings['selector_search'] = parse_started - search_started
+        record_stage(timings, 'parse', parse_started)
+
+        if price is not None:
+            if selector is not None:
+                order.record_win(url, selector)
+                logger.info(f"extracted price with selector '{selector}': ${price}")
+            else:
+                logger.info(f"extracted price via {path} in chrome: ${price}")
+            return price, transferred, time.monotonic() - started
+
+        logger.info(f"no price among {len(page.get('matches') or [])} selector matches")
+
+        if screenshots is not None:
+            screenshots.capture(driver, url, 'no price')
+
+        return None, transferred, None
+
+    except Exception as e:
+        logger.error(f"error getting price: {e}")
+        if screenshots is not None:
+            screenshots.capture(driver, url, 'error')
+        return None, 0, None
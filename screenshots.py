@@ -0,0 +1,84 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# failed-check screenshots kept in memory, bounded by count and by total size
+SCREENSHOT_RING_SIZE = int(os.getenv('SCREENSHOT_RING_SIZE', '20'))
+SCREENSHOT_RING_MB = float(os.getenv('SCREENSHOT_RING_MB', '20'))
+
+
+class Screenshot:
+    """png of the page a check failed on, with the url, why it was taken and when"""
+
+    def __init__(self, url, reason, png, taken_at=None):
+        self.url = url
+        self.reason = reason
+        self.png = png
+        self.taken_at = taken_at or time.time()
+
+    @property
+    def age(self):
+        return time.time() - self.taken_at
+
+
+class ScreenshotRing:
+    """bounded, thread-safe ring of the most recent failure screenshots
+
+    captures come straight from the driver as png bytes, so nothing touches disk and
+    concurrent workers never overwrite each other's captures. once the ring is full,
+    by count or by bytes, the oldest captures are dropped.
+    """
+
+    def __init__(self, size=SCREENSHOT_RING_SIZE, max_bytes=int(SCREENSHOT_RING_MB * 1024 * 1024)):
+        self.size = size
+        self.max_bytes = max_bytes
+        self._shots = deque()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._shots)
+
+    def capture(self, driver, url, reason):
+        """screenshot the driver's current page into the ring, returning the capture or None"""
+        try:
+            png = driver.get_screenshot_as_png()
+        except Exception as e:
+            logger.debug(f"could not capture screenshot of {url}: {e}")
+            return None
+        shot = Screenshot(url, reason, png)
+        self.add(shot)
+        logger.info(f"captured {reason} screenshot of {url} ({len(png) / 1024:.0f} KB)")
+        return shot
+
+    def add(self, shot):
+        with self._lock:
+            self._shots.append(shot)
+            self._bytes += len(shot.png)
+            while self._shots and (len(self._shots) > self.size or self._bytes > self.max_bytes):
+                self._bytes -= len(self._shots.popleft().png)
+
+    def recent(self, url=None, limit=None, max_age=None):
+        """newest first, optionally only for one url and no older than max_age seconds"""
+        with self._lock:
+            shots = list(reversed(self._shots))
+        shots = [
+            shot for shot in shots
+            if (url is None or shot.url == url) and (max_age is None or shot.age <= max_age)
+        ]
+        return shots[:limit] if limit is not None else shots
+
+    def latest(self, url=None, max_age=None):
+        shots = self.recent(url, 1, max_age)
+        return shots[0] if shots else None
+
+    def drain(self):
+        """remove and return every capture, oldest first"""
+        with self._lock:
+            shots, self._shots = list(self._shots), deque()
+            self._bytes = 0
+        return shots
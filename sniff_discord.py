@@ -1,387 +1,631 @@
+import time
+# taken before any other import so startup timings include module loading
+PROCESS_STARTED = time.monotonic()
+
+import io
 import os
-import undetected_chromedriver as uc
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-import re
 import discord
-from discord.ext import tasks, commands
+from discord.ext import commands
 import asyncio
 from dotenv import load_dotenv
 import logging
-import time
-import random
+from typing import Optional
+
+from browser import PREWARM_DRIVERS, DriverPool
+from coalesce import PriceCache
+from events import EVENT_LOG_FILE, EVENT_WEBHOOK_URL, EventStream, JsonlFileSink, PriceObservation, WebhookSink, count_observation
+from history import PriceHistory
+from metrics import (
+    CHALLENGES, CHECK_STAGE_SECONDS, CHECKS, COMMAND_SECONDS, DISCORD_SEND_SECONDS, DRIVER_RESTARTS,
+    FIRST_COMMAND_SECONDS, METRICS_HOST, METRICS_PORT, READY_SECONDS, start_metrics_server
+)
+from notifier import DiscordOutbox
+from pacing import HOST_CONCURRENCY, HostBudget
+from scheduler import ScrapeScheduler
+from scraper import PriceScraper
+from watchlist import Product, Watchlist
+from workers import SCRAPE_PROCESSES, ProcessScraper
 
 load_dotenv()
 
+# default product, used to seed the watchlist when watchlist.json doesn't exist yet
 PRODUCT_URL = "https://www.walmart.com/ip/WD-BLACK-4TB-SN850X-NVMe-Internal-Gaming-SSD-Solid-State-Drive-Gen4-PCIe-M-2-2280-Up-to-7-300-MB-s-WDS400T2X0E/1916728529"
+PRODUCT_NAME = "WD Black 4TB SN850X NVMe SSD"
 TARGET_PRICE = 149.99
-CHECK_INTERVAL = 600 
+CHECK_INTERVAL = 600
+
+# number of browser workers, each owning one chrome instance
+SCRAPE_WORKERS = int(os.getenv('SCRAPE_WORKERS', '2'))
+# how long !status may answer from the last observed price before scraping again
+STATUS_CACHE_TTL = int(os.getenv('STATUS_CACHE_TTL', '300'))
 
 DISCORD_TOKEN = os.getenv('DISCORD_BOT_TOKEN')
 CHANNEL_ID = int(os.getenv('DISCORD_CHANNEL_ID'))
 
+# slowest acceptable time to ready plus the first command's handler time
+FIRST_COMMAND_BUDGET = float(os.getenv('FIRST_COMMAND_BUDGET', '1'))
+
+# discord allows at most this many attachments per message
+MAX_ATTACHMENTS = 10
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
+logger.info(f"modules loaded in {time.monotonic() - PROCESS_STARTED:.2f}s")
+
+
+def screenshot_file(shot, filename):
+    """discord attachment read straight from a captured screenshot's bytes"""
+    return discord.File(io.BytesIO(shot.png), filename=filename)
 
 class PriceChecker(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.driver = None
         self.check_counter = 0
-        self.setup_driver()
-        self.price_check.start()
-        
-    def setup_driver(self):
-        """setup undetected chromedriver in headless mode"""
-        try:
-            options = uc.ChromeOptions()
-            
-            # headless
-            options.add_argument('--headless=new')
-            options.add_argument('--no-sandbox')
-            options.add_argument('--disable-dev-shm-usage')
-            options.add_argument('--disable-blink-features=AutomationControlled')
-            options.add_argument('--disable-extensions')
-            options.add_argument('--disable-plugins')
-            options.add_argument('--disable-images')
-            options.add_argument('--blink-settings=imagesEnabled=false')
-            
-            # stealth
-            options.add_argument('--disable-web-security')
-            options.add_argument('--allow-running-insecure-content')
-            options.add_argument('--disable-notifications')
-            options.add_argument('--disable-popup-blocking')
-            options.add_argument('--ignore-certificate-errors')
-            
-            # setting user agent
-            options.add_argument('--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
-            
-            self.driver = uc.Chrome(
-                options=options,
-                use_subprocess=False, 
-                headless=True 
-            )
-        
-            self.driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
-            
-            logger.info("undetected chromedriver setup successfully in headless mode")
-            
-        except Exception as e:
-            logger.error(f"error setting up chromedriver: {e}")
-            self.driver = None
-    
-    def get_walmart_price(self):
-        """get current price using undetected chromedriver"""
-        if not self.driver:
-            logger.error("chromedriver not available")
-            return None
-            
-        try:
-            logger.info("loading product page with undetected chromedriver...")
-            
-            # randomly delaying before loading
-            time.sleep(random.uniform(2, 5))
-            
-            self.driver.get(PRODUCT_URL)
-            
-            # wait for webpage load
-            WebDriverWait(self.driver, 15).until(
-                EC.presence_of_element_located((By.TAG_NAME, "body"))
-            )
-            
-            # more delay to appear more human like
-            time.sleep(random.uniform(3, 7))
-            
-            # price detection
-            price_selectors = [
-                "span[data-automation-id='product-price']",
-                "span.price-characteristic",
-                "div[data-testid='price-wrap']",
-                "span[itemprop='price']",
-                "div.inline-flex span[aria-hidden='true']",
-                "span.b.lh-copy.dark-gray.f2.mr1",
-                "div[data-testid='list-price']",
-                "div[data-testid='price-styling']",
-                "div[data-item-id='price']",
-                "div.price-display",
-                "span[class*='price']",
-                "div[class*='price']",
-                "span[data-testid='price-currency']",
-                "div[data-testid='price-current']",
-                "span.price-group",
-            ]
-            
-            for selector in price_selectors:
-                try:
-                    price_element = WebDriverWait(self.driver, 10).until(
-                        EC.presence_of_element_located((By.CSS_SELECTOR, selector))
-                    )
-                    price_text = price_element.text
-                    logger.info(f"found price text with selector '{selector}': {price_text}")
-
-                    price_match = re.search(r'(\d+[,.]?\d*[,.]?\d*)', price_text.replace(',', ''))
-                    if price_match:
-                        price = float(price_match.group(1).replace(',', ''))
-                        logger.info(f"extracted price via CSS: ${price}")
-                        return price
-                except Exception as e:
-                    logger.debug(f"selector '{selector}' failed: {e}")
-                    continue
-            
-            logger.info("could not find price using CSS selectors, trying XPath...")
-            
-            # if css doesn't work, try xpath
-            xpath_selectors = [
-                "//*[contains(@class, 'price')]",
-                "//*[contains(text(), '$')]",
-                "//*[@data-automation-id='product-price']",
-                "//span[@class='price-characteristic']"
-            ]
-            
-            for xpath in xpath_selectors:
-                try:
-                    price_element = self.driver.find_element(By.XPATH, xpath)
-                    price_text = price_element.text
-                    price_match = re.search(r'(\d+[,.]?\d*[,.]?\d*)', price_text.replace(',', ''))
-                    if price_match:
-                        price = float(price_match.group(1).replace(',', ''))
-                        logger.info(f"extracted price via XPath: ${price}")
-                        return price
-                except:
-                    continue
-            
-            self.driver.save_screenshot('walmart_debug.png')
-            logger.info("saved screenshot to walmart_debug.png")
-            
-            return None
-            
-        except Exception as e:
-            logger.error(f"error getting price: {e}")
-            if self.driver:
-                self.driver.save_screenshot('walmart_error.png')
-                logger.info("saved error screenshot to walmart_error.png")
-            return None
-    
+        self.watchlist = Watchlist().load(
+            CHECK_INTERVAL,
+            seed=Product(PRODUCT_URL, TARGET_PRICE, CHECK_INTERVAL, name=PRODUCT_NAME)
+        )
+        if SCRAPE_PROCESSES:
+            # worker mode: each process owns its own chrome, the bot only schedules and collects.
+            # two scheduler slots per process keep every shard busy while results are handled
+            self.scraper = ProcessScraper(SCRAPE_PROCESSES)
+            workers = SCRAPE_PROCESSES * 2
+        else:
+            self.scraper = PriceScraper(DriverPool(SCRAPE_WORKERS))
+            workers = SCRAPE_WORKERS
+        self.scheduler = ScrapeScheduler(
+            self.watchlist,
+            scrape=self.scrape,
+            on_result=self.handle_result,
+            workers=workers,
+            # one check per host gap for every chrome that can run one
+            budget=HostBudget(concurrency=HOST_CONCURRENCY or SCRAPE_PROCESSES or 1)
+        )
+        self.cache = PriceCache(STATUS_CACHE_TTL)
+        self.history = PriceHistory()
+        self.outbox = DiscordOutbox(bot)
+        self.startup_task = None
+
+        # every finished check is published here; each subscriber runs on its own queue
+        self.events = EventStream()
+        self.events.subscribe('alerts', self.alert_on_price)
+        self.events.subscribe('status', self.summarize_status)
+        self.events.subscribe('history', self.record_history, block=True)
+        self.events.subscribe('metrics', count_observation)
+        self.sinks = []
+        if EVENT_LOG_FILE:
+            self.sinks.append(JsonlFileSink(EVENT_LOG_FILE))
+            self.events.subscribe('file', self.sinks[-1])
+        if EVENT_WEBHOOK_URL:
+            self.sinks.append(WebhookSink(EVENT_WEBHOOK_URL))
+            self.events.subscribe('webhook', self.sinks[-1])
+
+    async def cog_load(self):
+        self.startup_task = asyncio.create_task(self.start_monitoring())
+
+    async def start_monitoring(self):
+        await self.bot.wait_until_ready()
+        logger.info("Price checker is ready!")
+        if PREWARM_DRIVERS:
+            # chrome starts in background threads, commands are answered while it launches
+            self.scraper.prewarm()
+        self.events.start()
+        self.outbox.start()
+        start_metrics_server()
+        # start up message
+        self.send_startup_message()
+        await self.scheduler.start()
+
+    def scrape(self, worker_id, product, trace):
+        """check one product, falling back to the worker's own chromedriver (runs in a scheduler thread)"""
+        return self.scraper.check(worker_id, product.url, trace)
+
+    async def fetch_price(self, product):
+        """check a product now, sharing any check of it already in flight"""
+        return await self.scheduler.request(product)
+
     def close_driver(self):
-        """close the chromedriver instance"""
-        if self.driver:
-            self.driver.quit()
-            self.driver = None
-            logger.info("chromedriver closed")
-    
-    @tasks.loop(seconds=CHECK_INTERVAL)
-    async def price_check(self):
-        """check price and send notification if below target"""
-        self.check_counter += 1
-        
-        price = await asyncio.get_event_loop().run_in_executor(None, self.get_walmart_price)
-        
+        """close the http session and all chromedriver instances"""
+        self.scraper.close()
+        self.history.close()
+
+    async def handle_result(self, product, result, source):
+        """update a product after any check and publish the observation to subscribers"""
+        price = result.price if result else None
+        if source == 'scheduled':
+            self.check_counter += 1
+            product.check_count += 1
+            if price is not None:
+                product.last_price = price
+
         if price is not None:
-            logger.info(f"Current price: ${price:.2f} (Check #{self.check_counter})")
-            
-            # send status update every 10 checks (every 50 minutes)
-            if self.check_counter % 10 == 0:
-                await self.send_status_update(price)
-            
-            if price <= TARGET_PRICE:
-                await self.send_discord_notification(price)
-            else:
-                logger.info(f"Price ${price:.2f} is above target ${TARGET_PRICE}")
+            self.cache.put(product.url, result)
+            logger.info(f"{product.name}: current price ${price:.2f} ({source} check #{product.check_count})")
         else:
-            logger.warning("Could not fetch price")
-    
-    async def send_discord_notification(self, price):
-        """send notification to discord channel when price is below target"""
-        channel = self.bot.get_channel(CHANNEL_ID)
-        if channel:
-            embed = discord.Embed(
-                title="🎯 Price Alert!",
-                description=f"The WD Black 4TB SSD is now below ${TARGET_PRICE}!",
-                color=0x00ff00
-            )
-            embed.add_field(name="Current Price", value=f"${price:.2f}", inline=True)
-            embed.add_field(name="Target Price", value=f"${TARGET_PRICE}", inline=True)
-            embed.add_field(name="Product Link", value=PRODUCT_URL, inline=False)
-            embed.add_field(name="Savings", value=f"${TARGET_PRICE - price:.2f} below target!", inline=False)
-            embed.set_footer(text=f"Check #{self.check_counter}")
-
-            await channel.send(
-                content=f"@everyone <@234052933606440961>",
-                embed=embed
-    )
-            
-            try:
-                if os.path.exists('walmart_debug.png'):
-                    file = discord.File('walmart_debug.png', filename='debug.png')
-                    embed.set_image(url="attachment://debug.png")
-                    await channel.send(embed=embed, file=file)
-                else:
-                    await channel.send(embed=embed)
-            except Exception as e:
-                await channel.send(embed=embed) 
-            
-            logger.info("Discord notification sent!")
-    
-    async def send_status_update(self, price):
-        """send periodic status update every 10 checks"""
-        channel = self.bot.get_channel(CHANNEL_ID)
-        if channel:
-            embed = discord.Embed(
-                title="📊 Price Check Status",
-                description="Regular price check update",
-                color=0x0099ff
-            )
-            embed.add_field(name="Product URL", value=PRODUCT_URL, inline=False)
-            embed.add_field(name="Current Price", value=f"${price:.2f}", inline=True)
-            embed.add_field(name="Target Price", value=f"${TARGET_PRICE}", inline=True)
-            embed.add_field(name="Check Count", value=f"#{self.check_counter}", inline=True)
-            embed.add_field(name="Time Running", value=f"{(self.check_counter * CHECK_INTERVAL) / 60:.1f} minutes", inline=True)
-            embed.add_field(name="Status", value="✅ Above target" if price > TARGET_PRICE else "🎯 Below target!", inline=True)
-            embed.add_field(name="Next Check", value=f"In {CHECK_INTERVAL/60} minutes", inline=True)
-            
-            await channel.send(embed=embed)
-            logger.info(f"Status update sent (Check #{self.check_counter})")
-    
-    async def send_startup_message(self):
+            logger.warning(f"Could not fetch price for {product.name}")
+        await self.events.publish(PriceObservation(product, result, source))
+
+    async def alert_on_price(self, observation):
+        """alert subscriber: notify when a product crosses below its target"""
+        product, price = observation.product, observation.price
+        if price is None:
+            return
+        below = observation.below_target
+        # only alert when the product crosses below target, not on every check while it stays there
+        if self.outbox.transition(product.url, 'below' if below else 'above') and below:
+            self.send_discord_notification(product, price)
+        elif below:
+            logger.info(f"{product.name}: price ${price:.2f} still below target, already alerted")
+        else:
+            logger.info(f"{product.name}: price ${price:.2f} is above target ${observation.target_price}")
+
+    async def summarize_status(self, observation):
+        """status subscriber: add a status line every 10 scheduled checks of a product"""
+        if observation.source == 'scheduled' and observation.price is not None and observation.check_count % 10 == 0:
+            self.send_status_update(observation.product, observation.price)
+
+    async def record_history(self, observation):
+        """history subscriber: append the observation to the price history"""
+        if observation.result is None:
+            return
+        await asyncio.to_thread(
+            self.history.record, observation.product.url, observation.price, observation.path,
+            observation.latency, observation.observed_at
+        )
+
+    async def resolve_product(self, ctx, query):
+        """look up a product from a command argument, replying with an error if it is ambiguous or unknown"""
+        product = self.watchlist.find(query)
+        if product is None:
+            if query is None:
+                await ctx.send("❌ Multiple products are being watched. Specify one by number or name (see `!list`).")
+            else:
+                await ctx.send(f"❌ No watched product matches `{query}`. Use `!list` to see watched products.")
+        return product
+
+    def format_interval(self, seconds):
+        return f"{seconds/60:.1f} minutes"
+
+    def time_running(self, product):
+        """time since the first recorded observation of a product"""
+        first_seen = self.history.first_seen(product.url)
+        if first_seen is None:
+            return "No checks recorded"
+        hours = (time.time() - first_seen) / 3600
+        return f"{hours:.1f} hours" if hours >= 1 else f"{hours * 60:.1f} minutes"
+
+    def send_discord_notification(self, product, price):
+        """queue an alert when price is below target"""
+        embed = discord.Embed(
+            title="🎯 Price Alert!",
+            description=f"{product.name} is now below ${product.target_price}!",
+            color=0x00ff00
+        )
+        embed.add_field(name="Current Price", value=f"${price:.2f}", inline=True)
+        embed.add_field(name="Target Price", value=f"${product.target_price}", inline=True)
+        embed.add_field(name="Product Link", value=product.url, inline=False)
+        embed.add_field(name="Savings", value=f"${product.target_price - price:.2f} below target!", inline=False)
+        embed.set_footer(text=f"Check #{product.check_count}")
+
+        message = {'content': "@everyone <@234052933606440961>", 'embed': embed}
+        # a failed attempt since the last scheduled check is worth seeing next to the alert
+        shot = self.scraper.screenshots.latest(product.url, max_age=product.interval)
+        if shot is not None:
+            message['file'] = screenshot_file(shot, 'debug.png')
+            embed.set_image(url="attachment://debug.png")
+
+        self.outbox.alert(CHANNEL_ID, **message)
+        logger.info(f"Discord notification queued for {product.name}")
+
+    def send_status_update(self, product, price):
+        """add a product's line to the next batched status update"""
+        status = "✅ Above target" if price > product.target_price else "🎯 Below target!"
+        next_check = self.scheduler.next_check_in(product)
+        next_check = f"next in {self.format_interval(next_check)}" if next_check is not None else "not scheduled"
+        self.outbox.status(
+            CHANNEL_ID,
+            product.name,
+            f"${price:.2f} (target ${product.target_price}) {status}\n"
+            f"Check #{product.check_count}, running {self.time_running(product)}, {next_check}"
+        )
+
+    def send_startup_message(self):
         """send notification when bot starts"""
-        channel = self.bot.get_channel(CHANNEL_ID)
-        if channel:
-            embed = discord.Embed(
-                title="🤖 Price Monitor Started",
-                description="The Walmart price monitor is now running!",
-                color=0x00ff00,
-                timestamp=discord.utils.utcnow()
-            )
-            embed.add_field(name="Product", value="WD Black 4TB SN850X NVMe SSD", inline=True)
-            embed.add_field(name="Target Price", value=f"${TARGET_PRICE}", inline=True)
-            embed.add_field(name="Check Interval", value=f"{CHECK_INTERVAL/60} minutes", inline=True)
-            embed.add_field(name="Product URL", value=PRODUCT_URL, inline=False)
-            embed.add_field(name="Commands", value="Use `!help` to see available commands", inline=False)
-            embed.set_footer(text="Monitoring started")
-            
-            await channel.send(embed=embed)
-            logger.info("Startup message sent")
-    
-    @commands.command(name='check', help='Manually check the current price')
-    async def manual_check(self, ctx):
+        embed = discord.Embed(
+            title="🤖 Price Monitor Started",
+            description="The Walmart price monitor is now running!",
+            color=0x00ff00,
+            timestamp=discord.utils.utcnow()
+        )
+        products = list(self.watchlist)
+        if len(products) == 1:
+            product = products[0]
+            embed.add_field(name="Product", value=product.name, inline=True)
+            embed.add_field(name="Target Price", value=f"${product.target_price}", inline=True)
+            embed.add_field(name="Check Interval", value=self.format_interval(product.interval), inline=True)
+            embed.add_field(name="Product URL", value=product.url, inline=False)
+        else:
+            embed.add_field(name="Products", value=f"{len(products)} watched", inline=True)
+            embed.add_field(name="Browser Workers", value=f"{SCRAPE_PROCESSES} processes" if SCRAPE_PROCESSES else str(SCRAPE_WORKERS), inline=True)
+        embed.add_field(name="Commands", value="Use `!help` to see available commands", inline=False)
+        embed.set_footer(text="Monitoring started")
+
+        self.outbox.send(CHANNEL_ID, embed=embed)
+        logger.info("Startup message queued")
+
+    @commands.command(name='check', help='Manually check the current price of a product')
+    async def manual_check(self, ctx, *, product: str = None):
         """manual price check command"""
-        await ctx.send("🔄 Checking current price...")
-        
-        price = await asyncio.get_event_loop().run_in_executor(None, self.get_walmart_price)
-        
+        product = await self.resolve_product(ctx, product)
+        if product is None:
+            return
+
+        await ctx.send(f"🔄 Checking current price of {product.name}...")
+
+        result = await self.fetch_price(product)
+        price = result.price if result else None
+
         if price is not None:
             embed = discord.Embed(
                 title="🛒 Manual Price Check",
+                description=product.name,
                 color=0x0099ff
             )
             embed.add_field(name="Current Price", value=f"${price:.2f}", inline=True)
-            embed.add_field(name="Target Price", value=f"${TARGET_PRICE}", inline=True)
-            embed.add_field(name="Status", value="✅ Above target" if price > TARGET_PRICE else "🎯 Below target!", inline=True)
-            embed.add_field(name="Difference", value=f"${abs(price - TARGET_PRICE):.2f} {'above' if price > TARGET_PRICE else 'below'} target", inline=True)
-            
+            embed.add_field(name="Target Price", value=f"${product.target_price}", inline=True)
+            embed.add_field(name="Status", value="✅ Above target" if price > product.target_price else "🎯 Below target!", inline=True)
+            embed.add_field(name="Difference", value=f"${abs(price - product.target_price):.2f} {'above' if price > product.target_price else 'below'} target", inline=True)
+
             await ctx.send(embed=embed)
         else:
             await ctx.send("❌ Could not fetch the current price. Check logs for details.")
-    
-    @commands.command(name='status', help='Show current monitoring status')
-    async def show_status(self, ctx):
-        """Show current monitoring status"""
-        # get current price for status
-        price = await asyncio.get_event_loop().run_in_executor(None, self.get_walmart_price)
-        
+
+    @commands.command(name='status', help='Show current monitoring status: !status [product] [refresh]')
+    async def show_status(self, ctx, *, product: str = None):
+        """Show current monitoring status, from the price cache unless refresh is given"""
+        refresh = False
+        if product is not None:
+            words = product.split()
+            if words[-1].lower() == 'refresh':
+                refresh = True
+                product = ' '.join(words[:-1]) or None
+        product = self.watchlist.find(product)
+
         embed = discord.Embed(
             title="📊 Monitoring Status",
             color=0x0099ff
         )
-        
-        if price is not None:
-            embed.add_field(name="Current Price", value=f"${price:.2f}", inline=True)
-            embed.add_field(name="Target Price", value=f"${TARGET_PRICE}", inline=True)
-            embed.add_field(name="Price Status", value="✅ Above target" if price > TARGET_PRICE else "🎯 Below target!", inline=True)
+
+        if product is not None:
+            # get current price for status
+            result = None if refresh else self.cache.get(product.url)
+            if result is None:
+                result = await self.fetch_price(product)
+            price = result.price if result else None
+
+            if price is not None:
+                age = self.cache.age(product.url) or 0
+                embed.add_field(name="Current Price", value=f"${price:.2f}", inline=True)
+                embed.set_footer(text=f"Price observed {age:.0f}s ago. Add 'refresh' to !status to force a new check.")
+                embed.add_field(name="Target Price", value=f"${product.target_price}", inline=True)
+                embed.add_field(name="Price Status", value="✅ Above target" if price > product.target_price else "🎯 Below target!", inline=True)
+            else:
+                embed.add_field(name="Price Status", value="❌ Unable to fetch", inline=True)
+
+            next_check = self.scheduler.next_check_in(product)
+            embed.add_field(name="Total Checks", value=f"#{product.check_count}", inline=True)
+            embed.add_field(name="Check Interval", value=self.format_interval(product.interval), inline=True)
+            embed.add_field(name="Time Running", value=self.time_running(product), inline=True)
+            embed.add_field(name="Next Auto Check", value=f"In {self.format_interval(next_check)}" if next_check is not None else "Not scheduled", inline=True)
+            embed.add_field(name="Product", value=product.name, inline=True)
         else:
-            embed.add_field(name="Price Status", value="❌ Unable to fetch", inline=True)
-        
-        embed.add_field(name="Total Checks", value=f"#{self.check_counter}", inline=True)
-        embed.add_field(name="Check Interval", value=f"{CHECK_INTERVAL/60} minutes", inline=True)
-        embed.add_field(name="Time Running", value=f"{(self.check_counter * CHECK_INTERVAL) / 3600:.1f} hours", inline=True)
-        embed.add_field(name="Next Auto Check", value=f"In {CHECK_INTERVAL/60} minutes", inline=True)
-        embed.add_field(name="Product", value="WD Black 4TB SN850X NVMe SSD", inline=True)
-        embed.add_field(name="Monitor Active", value="✅ Yes" if self.price_check.is_running() else "❌ No", inline=True)
-        
+            embed.add_field(name="Products Watched", value=str(len(self.watchlist)), inline=True)
+            embed.add_field(name="Total Checks", value=f"#{self.check_counter}", inline=True)
+            embed.add_field(name="Browser Workers", value=f"{SCRAPE_PROCESSES} processes" if SCRAPE_PROCESSES else str(SCRAPE_WORKERS), inline=True)
+
+        embed.add_field(name="Monitor Active", value="✅ Yes" if self.scheduler.is_running() else "❌ No", inline=True)
+        embed.add_field(name="Extraction Paths", value=self.scraper.stats.summary(), inline=False)
+
+        await ctx.send(embed=embed)
+
+    @commands.command(name='history', help='Daily price range: !history [days] [product]')
+    async def show_history(self, ctx, days: Optional[int] = 14, *, product: str = None):
+        """Show the daily low/high of a product over the last days"""
+        product = await self.resolve_product(ctx, product)
+        if product is None:
+            return
+
+        rows = self.history.daily(product.url, days)
+        lines = [
+            f"`{time.strftime('%Y-%m-%d', time.gmtime(day))}` ${low:.2f} – ${high:.2f} ({count} checks)"
+            for day, low, high, count in rows[-30:]
+        ]
+        embed = discord.Embed(
+            title=f"📈 Price History ({days} days)",
+            description="\n".join(lines) or "No prices recorded in this period.",
+            color=0x0099ff
+        )
+        embed.set_footer(text=product.name)
+        await ctx.send(embed=embed)
+
+    @commands.command(name='low', help='Lowest price seen: !low [days] [product]')
+    async def show_low(self, ctx, days: Optional[int] = 30, *, product: str = None):
+        """Show the lowest price of a product in the last days"""
+        product = await self.resolve_product(ctx, product)
+        if product is None:
+            return
+
+        lowest = self.history.lowest(product.url, days)
+        if lowest is None:
+            await ctx.send(f"❌ No prices recorded for {product.name} in the last {days} days.")
+            return
+
+        price, ts = lowest
+        embed = discord.Embed(
+            title=f"📉 Lowest Price ({days} days)",
+            description=product.name,
+            color=0x0099ff
+        )
+        embed.add_field(name="Lowest Price", value=f"${price:.2f}", inline=True)
+        embed.add_field(name="Seen", value=f"<t:{ts}:R>", inline=True)
+        embed.add_field(name="Target Price", value=f"${product.target_price}", inline=True)
         await ctx.send(embed=embed)
-    
+
+    @commands.command(name='stats', help='Price statistics: !stats [days] [product]')
+    async def show_stats(self, ctx, days: Optional[int] = 30, *, product: str = None):
+        """Show min/max/percentiles of a product over the last days"""
+        product = await self.resolve_product(ctx, product)
+        if product is None:
+            return
+
+        stats = self.history.stats(product.url, days)
+        embed = discord.Embed(
+            title=f"📊 Price Stats ({days} days)",
+            description=product.name,
+            color=0x0099ff
+        )
+        embed.add_field(name="Checks", value=f"{stats['checks']} ({stats['found']} with a price)", inline=True)
+        if stats['found']:
+            embed.add_field(name="Min / Max", value=f"${stats['min']:.2f} / ${stats['max']:.2f}", inline=True)
+            embed.add_field(name="Average", value=f"${stats['avg']:.2f}", inline=True)
+            embed.add_field(name="p10 / p50 / p90", value=f"${stats['p10']:.2f} / ${stats['p50']:.2f} / ${stats['p90']:.2f}", inline=True)
+            embed.add_field(name="Avg Check Time", value=f"{stats['latency_ms'] / 1000:.1f}s", inline=True)
+        await ctx.send(embed=embed)
+
+    @commands.command(name='metrics', help='Show check timings, extraction success and driver restarts')
+    async def show_metrics(self, ctx):
+        """Show the aggregated check metrics"""
+        checks = {path: count for (path,), count in CHECKS.values().items()}
+        total = sum(checks.values())
+
+        embed = discord.Embed(
+            title="📈 Price Check Metrics",
+            color=0x0099ff
+        )
+        if total:
+            found = total - checks.get('miss', 0)
+            paths = "\n".join(f"{path}: {count} ({count / total:.0%})" for path, count in sorted(checks.items(), key=lambda item: -item[1]))
+            challenges = sum(CHALLENGES.values().values())
+            embed.add_field(name="Checks by Path", value=paths, inline=True)
+            embed.add_field(name="Success Rate", value=f"{found / total:.1%} of {total}", inline=True)
+            embed.add_field(name="Challenge Rate", value=f"{challenges / total:.1%}", inline=True)
+        else:
+            embed.add_field(name="Checks", value="No checks yet", inline=True)
+        embed.add_field(name="Driver Restarts", value=str(sum(DRIVER_RESTARTS.values().values())), inline=True)
+
+        stages = [
+            f"{stage}: {mean * 1000:.0f}ms avg, p95 ≤ {p95 * 1000:.0f}ms ({count})"
+            for (stage,), (count, mean, p95) in sorted(CHECK_STAGE_SECONDS.summary().items())
+        ]
+        sends = [
+            f"{kind}: {mean * 1000:.0f}ms avg ({count})"
+            for (kind,), (count, mean, p95) in sorted(DISCORD_SEND_SECONDS.summary().items())
+        ]
+        if stages:
+            embed.add_field(name="Check Stages", value="\n".join(stages)[:1024], inline=False)
+        if sends:
+            embed.add_field(name="Discord Sends", value="\n".join(sends), inline=False)
+        startup = [f"ready after {READY_SECONDS.get():.2f}s"] if READY_SECONDS.get() is not None else []
+        startup += [
+            f"!{command}: {mean * 1000:.0f}ms avg, p95 ≤ {p95 * 1000:.0f}ms ({count})"
+            for (command,), (count, mean, p95) in sorted(COMMAND_SECONDS.summary().items())
+        ]
+        if startup:
+            embed.add_field(name="Startup & Commands", value="\n".join(startup)[:1024], inline=False)
+        if METRICS_PORT:
+            embed.set_footer(text=f"Prometheus metrics at http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+
+        await ctx.send(embed=embed)
+
+    @commands.command(name='debug', help='Recent failed-check screenshots: !debug [count] [product]')
+    async def show_debug(self, ctx, count: Optional[int] = 3, *, product: str = None):
+        """Send the most recent screenshots of checks that found no price"""
+        url = None
+        if product is not None:
+            product = await self.resolve_product(ctx, product)
+            if product is None:
+                return
+            url = product.url
+
+        shots = self.scraper.screenshots.recent(url, max(1, min(count, MAX_ATTACHMENTS)))
+        if not shots:
+            await ctx.send("No failed-check screenshots captured yet.")
+            return
+
+        names = {p.url: p.name for p in self.watchlist}
+        lines = [
+            f"`{index}.` {names.get(shot.url, shot.url)}: {shot.reason}, {self.format_interval(shot.age)} ago"
+            for index, shot in enumerate(shots, start=1)
+        ]
+        embed = discord.Embed(
+            title="🐞 Recent Failure Screenshots",
+            description="\n".join(lines)[:4000],
+            color=0xff9900
+        )
+        files = [screenshot_file(shot, f'debug{index}.png') for index, shot in enumerate(shots, start=1)]
+        await ctx.send(embed=embed, files=files)
+
+    @commands.command(name='list', help='List watched products')
+    async def list_products(self, ctx):
+        """List watched products with their targets"""
+        lines = []
+        for index, product in enumerate(self.watchlist, start=1):
+            last = f"${product.last_price:.2f}" if product.last_price is not None else "n/a"
+            lines.append(f"`{index}.` **{product.name}** target ${product.target_price:.2f}, last {last}, every {self.format_interval(product.interval)}")
+
+        embed = discord.Embed(
+            title="📋 Watchlist",
+            description="\n".join(lines)[:4000] or "No products watched. Use `!watch` to add one.",
+            color=0x0099ff
+        )
+        await ctx.send(embed=embed)
+
+    @commands.command(name='watch', help='Watch a product: !watch <target> <url> [name]')
+    async def watch_product(self, ctx, target: float, url: str, *, name: str = None):
+        """Add a product to the watchlist"""
+        product = self.watchlist.add(Product(url, target, CHECK_INTERVAL, name=name))
+        if self.scheduler.is_running():
+            await self.scheduler.schedule(product)
+
+        await ctx.send(f"👀 Now watching **{product.name}** with target ${product.target_price:.2f}")
+        logger.info(f"{ctx.author} added {product.url} with target ${product.target_price}")
+
+    @commands.command(name='unwatch', help='Stop watching a product')
+    async def unwatch_product(self, ctx, *, product: str):
+        """Remove a product from the watchlist"""
+        product = await self.resolve_product(ctx, product)
+        if product is None:
+            return
+
+        self.watchlist.remove(product)
+        self.outbox.reset(product.url)
+        await ctx.send(f"🗑️ Stopped watching **{product.name}**")
+        logger.info(f"{ctx.author} removed {product.url}")
+
     @commands.command(name='restart', help='Restart the price monitoring')
     async def restart_monitor(self, ctx):
-        """Restart the price monitoring task"""
-        self.price_check.restart()
+        """Restart the price monitoring scheduler"""
+        await self.scheduler.stop()
+        await self.scheduler.start()
         await ctx.send("✅ Price monitoring has been restarted!")
-    
+
     @commands.command(name='stop', help='Stop the price monitoring')
     async def stop_monitor(self, ctx):
-        """Stop the price monitoring task"""
-        self.price_check.cancel()
+        """Stop the price monitoring scheduler"""
+        await self.scheduler.stop()
         await ctx.send("⏹️ Price monitoring has been stopped. Use `!restart` to resume.")
-    
-    @commands.command(name='target', help='Set a new target price')
-    async def set_target(self, ctx, new_target: float):
+
+    @commands.command(name='target', help='Set a new target price: !target <price> [product]')
+    async def set_target(self, ctx, new_target: float, *, product: str = None):
         """Set a new target price"""
-        global TARGET_PRICE
-        old_target = TARGET_PRICE
-        TARGET_PRICE = new_target
-        
+        product = await self.resolve_product(ctx, product)
+        if product is None:
+            return
+
+        old_target = product.target_price
+        product.target_price = new_target
+        self.watchlist.save()
+        # let the next check alert again if the product is already below the new target
+        self.outbox.reset(product.url)
+
         embed = discord.Embed(
             title="🎯 Target Price Updated",
+            description=product.name,
             color=0x0099ff
         )
         embed.add_field(name="Old Target", value=f"${old_target:.2f}", inline=True)
-        embed.add_field(name="New Target", value=f"${TARGET_PRICE:.2f}", inline=True)
+        embed.add_field(name="New Target", value=f"${product.target_price:.2f}", inline=True)
         embed.add_field(name="Changed By", value=ctx.author.display_name, inline=True)
-        
+
         await ctx.send(embed=embed)
-        logger.info(f"Target price changed from ${old_target} to ${TARGET_PRICE} by {ctx.author}")
+        logger.info(f"Target price of {product.name} changed from ${old_target} to ${product.target_price} by {ctx.author}")
 
-    @commands.command(name='interval', help='Set a new check interval (in seconds)')
-    async def set_interval(self, ctx, new_interval: int):
+    @commands.command(name='interval', help='Set a new check interval (in seconds): !interval <seconds> [product]')
+    async def set_interval(self, ctx, new_interval: int, *, product: str = None):
         global CHECK_INTERVAL
-        old_interval = CHECK_INTERVAL
-        CHECK_INTERVAL = new_interval
+        if product is None:
+            # no product given: change the default and every watched product
+            old_interval = CHECK_INTERVAL
+            CHECK_INTERVAL = new_interval
+            products = list(self.watchlist)
+            label = "All products"
+        else:
+            product = await self.resolve_product(ctx, product)
+            if product is None:
+                return
+            old_interval = product.interval
+            products = [product]
+            label = product.name
 
-        # restart loop with new interval
-        self.price_check.change_interval(seconds=CHECK_INTERVAL)
+        for product in products:
+            product.interval = new_interval
+            # reschedule with new interval
+            if self.scheduler.is_running():
+                await self.scheduler.schedule(product, new_interval)
+        self.watchlist.save()
 
         embed = discord.Embed(
             title="⏰ Check Interval Updated",
+            description=label,
             color=0x0099ff
         )
         embed.add_field(name="Old Interval", value=f"{old_interval} sec", inline=True)
-        embed.add_field(name="New Interval", value=f"{CHECK_INTERVAL} sec", inline=True)
+        embed.add_field(name="New Interval", value=f"{new_interval} sec", inline=True)
         embed.add_field(name="Changed By", value=ctx.author.display_name, inline=True)
 
         await ctx.send(embed=embed)
-        logger.info(f"Check interval changed from {old_interval} to {CHECK_INTERVAL} by {ctx.author}")
-    
-    @price_check.before_loop
-    async def before_price_check(self):
-        await self.bot.wait_until_ready()
-        logger.info("Price checker is ready!")
-        # start up message
-        await self.send_startup_message()
-    
-    def cog_unload(self):
+        logger.info(f"Check interval of {label} changed from {old_interval} to {new_interval} by {ctx.author}")
+
+    async def cog_unload(self):
         """Cleanup when cog is unloaded"""
-        self.price_check.cancel()
+        if self.startup_task:
+            self.startup_task.cancel()
+        await self.scheduler.stop()
+        # let subscribers drain before the history and outbox behind them close
+        await self.events.stop()
+        for sink in self.sinks:
+            await sink.close()
+        await self.outbox.stop()
         self.close_driver()
 
 # bot start
 intents = discord.Intents.default()
 intents.message_content = True 
-bot = commands.Bot(command_prefix='!', intents=intents)
+
+class PriceBot(commands.Bot):
+    async def setup_hook(self):
+        # runs once before the first connect; on_ready fires again after every reconnect
+        await self.add_cog(PriceChecker(self))
+
+    async def get_context(self, origin, /, **kwargs):
+        # stamped on our own monotonic clock as the message comes in, for handler latency
+        received_at = time.monotonic()
+        ctx = await super().get_context(origin, **kwargs)
+        ctx.received_at = received_at
+        return ctx
+
+bot = PriceBot(command_prefix='!', intents=intents)
 
 @bot.event
 async def on_ready():
     logger.info(f'{bot.user} has logged in!')
-    await bot.add_cog(PriceChecker(bot))
+    if READY_SECONDS.get() is None:
+        READY_SECONDS.set(time.monotonic() - PROCESS_STARTED)
+        logger.info(f"ready for commands {READY_SECONDS.get():.2f}s after start")
+
+@bot.after_invoke
+async def record_command_time(ctx):
+    """time each command from the bot receiving its message to the end of its handler"""
+    elapsed = time.monotonic() - ctx.received_at
+    COMMAND_SECONDS.observe(elapsed, command=ctx.command.qualified_name)
+    if FIRST_COMMAND_SECONDS.get() is None and READY_SECONDS.get() is not None:
+        # startup cost of answering: time to ready plus the first handler, not however
+        # long it took somebody to type a command
+        first = READY_SECONDS.get() + elapsed
+        FIRST_COMMAND_SECONDS.set(first)
+        logger.info(f"first command !{ctx.command.qualified_name} answered in {elapsed:.2f}s, {first:.2f}s of startup")
+        if first > FIRST_COMMAND_BUDGET:
+            logger.warning(f"ready plus first command took {first:.2f}s, over the {FIRST_COMMAND_BUDGET:.1f}s budget")
 
 @bot.event
 async def on_command_error(ctx, error):
@@ -396,72 +640,15 @@ async def on_command_error(ctx, error):
         await ctx.send("❌ An error occurred while executing the command.")
         logger.error(f"Command error: {error}")
 
-# TEST FUNCTION
-def test_price_extraction():
-    """test price extraction without starting the bot"""
-    print("testing Walmart price extraction with undetected chromedriver...")
-    
-    try:
-        # temp driver for testing
-        options = uc.ChromeOptions()
-        options.add_argument('--headless=new')
-        options.add_argument('--no-sandbox')
-        options.add_argument('--disable-dev-shm-usage')
-        
-        driver = uc.Chrome(options=options)
-        
-        # test price extraction logic
-        driver.get(PRODUCT_URL)
-        time.sleep(5)  # page load
-        
-        # price find
-        selectors = [
-            "span[data-automation-id='product-price']",
-            "span.price-characteristic",
-            "div[data-testid='price-wrap']"
-        ]
-        
-        for selector in selectors:
-            try:
-                element = driver.find_element(By.CSS_SELECTOR, selector)
-                price_text = element.text
-                match = re.search(r'(\d+\.?\d*)', price_text.replace(',', ''))
-                if match:
-                    price = float(match.group(1))
-                    print(f"Success! Found price: ${price}")
-                    driver.quit()
-                    return price
-            except:
-                continue
-        
-        driver.save_screenshot('test_debug.png')
-        print("could not find price. Screenshot saved to test_debug.png")
-        driver.quit()
-        return None
-        
-    except Exception as e:
-        print(f"Test error: {e}")
-        return None
-
 if __name__ == "__main__":
     if not DISCORD_TOKEN or not CHANNEL_ID:
         print("error: Please set DISCORD_BOT_TOKEN and DISCORD_CHANNEL_ID in .env file")
         exit(1)
-    
-    # Test price extraction first
-    # print("Testing price extraction before starting bot...")
-    # test_price = test_price_extraction()
-    
-    # if test_price is None:
-    #     print("Warning: Could not extract price in initial test.")
-    #     print("The bot will still run, but check the debug screenshots.")
-    # else:
-    #     print(f"Test successful! Price: ${test_price}")
-    
+
     print("starting Discord bot...")
     try:
         bot.run(DISCORD_TOKEN)
     except KeyboardInterrupt:
         print("Bot stopped by user")
     except Exception as e:
-        print(f"Bot error: {e}")
\ No newline at end of file
+        print(f"Bot error: {e}")
@@ -0,0 +1,159 @@
+"""headless batch price check that streams results as json lines
+
+reads products from a file (or stdin), checks them concurrently with the same engine
+as the discord bot and prints one json object per product as soon as its check ends.
+exits 0 if any product is at or below its target, 1 if none is and 2 on bad input.
+
+    python sweep.py products.txt --parallel 4 > results.jsonl
+    cat watchlist.json | python sweep.py - --processes 2
+
+input is either a watchlist.json array or one product per line: `<url> <target> [name]`
+(whitespace or comma separated), with blank lines and lines starting with # ignored.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from browser import DriverPool
+from pacing import HOST_CONCURRENCY, HOST_JITTER, HOST_MIN_GAP, HostBudget
+from scraper import PriceScraper
+from watchlist import Product
+
+logger = logging.getLogger(__name__)
+
+EXIT_HIT = 0
+EXIT_NO_HIT = 1
+EXIT_BAD_INPUT = 2
+
+
+def parse_products(text):
+    """products from watchlist json or `<url> <target> [name]` lines; raises ValueError on bad input"""
+    if text.lstrip().startswith('['):
+        return [Product.from_dict(item, 0) for item in json.loads(text)]
+
+    products = []
+    for number, line in enumerate(text.splitlines(), start=1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        parts = line.replace(',', ' ', 2).split(None, 2)
+        url = parts[0]
+        if not url.startswith(('http://', 'https://')):
+            raise ValueError(f"line {number}: expected a url, got {url!r}")
+        if len(parts) < 2:
+            raise ValueError(f"line {number}: missing a target price for {url}")
+        try:
+            target = float(parts[1].lstrip('$'))
+        except ValueError:
+            raise ValueError(f"line {number}: expected a target price, got {parts[1]!r}")
+        products.append(Product(url, target, 0, name=parts[2] if len(parts) > 2 else None))
+    return products
+
+
+def result_record(product, result, error=None):
+    price = result.price if result else None
+    hit = price is not None and price <= product.target_price
+    return {
+        'url': product.url,
+        'name': product.name,
+        'target': product.target_price,
+        'price': price,
+        'hit': hit,
+        'path': result.path if result else 'error',
+        'challenge': result.challenge if result else False,
+        'latency': round(result.latency, 3) if result else None,
+        'checked_at': time.time(),
+        'error': error,
+    }
+
+
+async def sweep(products, scraper, parallel, budget, out=sys.stdout):
+    """check every product with `parallel` concurrent workers, writing each result as it lands;
+    returns the number of products at or below target"""
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=parallel, thread_name_prefix='sweep')
+    pending = asyncio.Queue()
+    for product in products:
+        pending.put_nowait(product)
+    hits = 0
+
+    async def worker(slot):
+        nonlocal hits
+        while not pending.empty():
+            product = pending.get_nowait()
+            error = None
+            await budget.acquire(product.url)
+            try:
+                result = await loop.run_in_executor(executor, scraper.check, slot, product.url)
+            except Exception as e:
+                logger.error(f"error checking {product.url}: {e}")
+                result, error = None, str(e)
+            budget.report(product.url, bool(result and result.challenge))
+
+            record = result_record(product, result, error)
+            hits += record['hit']
+            out.write(json.dumps(record) + '\n')
+            out.flush()
+
+    try:
+        await asyncio.gather(*(worker(slot) for slot in range(parallel)))
+    finally:
+        executor.shutdown(wait=False)
+    return hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('input', nargs='?', default='-', help='product list file, or - for stdin')
+    parser.add_argument('--parallel', type=int, default=4, help='checks running at once (one chrome per check slot)')
+    parser.add_argument('--processes', type=int, default=0, help='shard checks across this many worker processes')
+    parser.add_argument('--min-gap', type=float, default=HOST_MIN_GAP, help='minimum seconds between checks of one host')
+    parser.add_argument('--jitter', type=float, default=HOST_JITTER, help='extra random seconds added to each host gap')
+    parser.add_argument('--host-concurrency', type=int, default=HOST_CONCURRENCY,
+                        help='checks of one host allowed to start per gap (default: one per process)')
+    parser.add_argument('-v', '--verbose', action='store_true', help='log progress to stderr')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+
+    try:
+        if args.input == '-':
+            text = sys.stdin.read()
+        else:
+            with open(args.input, encoding='utf-8') as f:
+                text = f.read()
+        products = parse_products(text)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"error: could not read products: {e}", file=sys.stderr)
+        sys.exit(EXIT_BAD_INPUT)
+
+    if not products:
+        print("error: no products to check", file=sys.stderr)
+        sys.exit(EXIT_BAD_INPUT)
+
+    parallel = max(1, min(args.parallel, len(products)))
+    if args.processes:
+        # imported here so thread mode never pays for multiprocessing setup
+        from workers import ProcessScraper
+        scraper = ProcessScraper(args.processes)
+    else:
+        scraper = PriceScraper(DriverPool(parallel, name='sweep'))
+    budget = HostBudget(min_gap=args.min_gap, jitter=args.jitter, concurrency=args.host_concurrency or args.processes or 1)
+
+    started = time.monotonic()
+    try:
+        hits = asyncio.run(sweep(products, scraper, parallel, budget))
+    except KeyboardInterrupt:
+        sys.exit(130)
+    finally:
+        scraper.close()
+    logger.info(f"checked {len(products)} products in {time.monotonic() - started:.1f}s, {hits} at or below target")
+    sys.exit(EXIT_HIT if hits else EXIT_NO_HIT)
+
+
+if __name__ == '__main__':
+    main()
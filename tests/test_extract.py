@@ -0,0 +1,28 @@
+"""price parsing from an element's rendered text and markup, as read by the chrome fallback"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from extract import US_PARSER, PriceParser
+
+
+@pytest.mark.parametrize('text, markup, expected', [
+    ('$139.99', '$<span>139</span><span class="price-mark">.</span><span>99</span>', 139.99),
+    ('$139.9912', '<span>$139.99</span><span class="count">12</span>', 139.99),
+    ('$14499', '$144<sup>99</sup>', 144.99),
+    ('$1,299', '<span>$1,299</span>', 1299.0),
+    ('Now $1,249.00', None, 1249.0),
+    (None, '<span>$</span><span>1,144</span><span>99</span>', 1144.99),
+    ('out of stock', None, None),
+])
+def test_parse(text, markup, expected):
+    assert US_PARSER.parse(text, markup) == expected
+
+
+def test_parse_decimal_comma():
+    parser = PriceParser(decimal=',', thousands='.')
+    assert parser.parse('1.299,00 €') == 1299.0
+    assert parser.parse('139,99 €', '<span>139,99 €</span><span>12</span>') == 139.99
@@ -0,0 +1,39 @@
+"""http extraction against the saved pages in bench/corpus, served from a local http server"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'bench'))
+
+from fetcher import HttpFetcher
+from retailers import WALMART
+from run_bench import load_manifest, serve_corpus
+
+MANIFEST = load_manifest()
+
+
+@pytest.fixture(scope='module')
+def corpus():
+    server, base_url = serve_corpus()
+    fetcher = HttpFetcher()
+    yield fetcher, base_url
+    fetcher.close()
+    server.shutdown()
+
+
+@pytest.mark.parametrize('fixture', MANIFEST, ids=[fixture['file'] for fixture in MANIFEST])
+def test_fetch_price(corpus, fixture):
+    fetcher, base_url = corpus
+    timings = {}
+    price, path, challenge, transferred = fetcher.fetch_price(f"{base_url}/{fixture['file']}", timings, WALMART)
+
+    # pages without structured data are meant to miss over http and fall back to chrome
+    expected = fixture['price'] if fixture['structured'] else None
+    assert price == expected
+    assert path == fixture['path']
+    assert challenge == fixture['challenge']
+    assert transferred > 0
+    assert 'fetch' in timings
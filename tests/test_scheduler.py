@@ -0,0 +1,204 @@
+"""scheduler coalescing and stop/restart, with a fake scrape in place of chrome"""
+import asyncio
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pacing import HostBudget
+from scheduler import ScrapeScheduler
+from watchlist import Product, Watchlist
+
+URL = 'https://www.walmart.com/ip/1'
+
+
+class FakeScrape:
+    """scrape that takes `delay` seconds and records which worker ids overlap"""
+
+    def __init__(self, delay=0.2):
+        self.delay = delay
+        self.calls = []
+        self.overlaps = []
+        self._busy = set()
+        self._lock = threading.Lock()
+
+    def __call__(self, worker_id, product, trace):
+        with self._lock:
+            if worker_id in self._busy:
+                self.overlaps.append(worker_id)
+            self._busy.add(worker_id)
+            self.calls.append(worker_id)
+            result = len(self.calls)
+        time.sleep(self.delay)
+        with self._lock:
+            self._busy.discard(worker_id)
+        # the call's number, so callers sharing one check can be told apart
+        return result
+
+
+class FixedInterval:
+    def next_delay(self, product, result):
+        return 3600
+
+
+@pytest.fixture
+def product():
+    return Product(URL, 100, 3600)
+
+
+def make_scheduler(tmp_path, scrape, products=(), budget=None):
+    watchlist = Watchlist(str(tmp_path / 'watchlist.json'))
+    for product in products:
+        watchlist.add(product)
+    delivered = []
+
+    async def on_result(product, result, source):
+        delivered.append(source)
+
+    scheduler = ScrapeScheduler(
+        watchlist, scrape, on_result, workers=2, policy=FixedInterval(),
+        budget=budget or HostBudget(min_gap=0, jitter=0)
+    )
+    return scheduler, delivered
+
+
+def test_stop_during_manual_check_ends_its_flight(tmp_path, product):
+    scrape = FakeScrape()
+    scheduler, _ = make_scheduler(tmp_path, scrape)
+
+    async def run():
+        await scheduler.start()
+        request = asyncio.create_task(scheduler.request(product))
+        await asyncio.sleep(0.05)
+        await scheduler.stop()
+        with pytest.raises(asyncio.CancelledError):
+            await asyncio.wait_for(request, 2)
+        assert not scheduler._flights.inflight(URL)
+
+        # after a restart the product can be checked again
+        await scheduler.start()
+        await asyncio.wait_for(scheduler.request(product), 2)
+        await scheduler.stop()
+
+    asyncio.run(run())
+
+
+def test_stop_cancels_scheduled_checks_waiting_for_the_host(tmp_path, product):
+    other = Product('https://www.walmart.com/ip/2', 100, 3600)
+    scrape = FakeScrape()
+    scheduler, delivered = make_scheduler(tmp_path, scrape, [product, other], HostBudget(min_gap=0.3, jitter=0))
+
+    async def run():
+        await scheduler.start()
+        # one scheduled check is scraping, the other waits for the host's next slot
+        await asyncio.sleep(0.1)
+        await scheduler.stop()
+        calls, results, due = len(scrape.calls), len(delivered), other.next_due
+
+        await asyncio.wait_for(scheduler.request(product), 2)
+        # long enough for a check that outlived stop() to reach the scrape
+        await asyncio.sleep(0.5)
+        assert scrape.calls[calls:] == [0]
+        assert delivered[results:] == ['manual']
+        assert scrape.overlaps == []
+        # and nothing was rescheduled after the scheduler stopped
+        assert other.next_due == due
+
+    asyncio.run(run())
+
+
+async def manual_joins_scheduled(scheduler, product):
+    scheduler.watchlist.add(product)
+    await scheduler.schedule(product, 0)
+    await asyncio.sleep(0.05)
+    assert scheduler._flights.inflight(product.url)
+    return asyncio.create_task(scheduler.request(product))
+
+
+async def scheduled_joins_manual(scheduler, product):
+    request = asyncio.create_task(scheduler.request(product))
+    await asyncio.sleep(0.02)
+    scheduler.watchlist.add(product)
+    await scheduler.schedule(product, 0)
+    await asyncio.sleep(0.05)
+    return request
+
+
+def test_manual_request_joins_scheduled_check(tmp_path, product):
+    scrape = FakeScrape()
+    scheduler, delivered = make_scheduler(tmp_path, scrape)
+
+    async def run():
+        await scheduler.start()
+        request = await manual_joins_scheduled(scheduler, product)
+        assert await asyncio.wait_for(request, 2) == 1
+        await scheduler.stop()
+
+    asyncio.run(run())
+    assert len(scrape.calls) == 1
+    assert delivered == ['scheduled']
+    assert scheduler.next_check_in(product) > 3000
+
+
+def test_scheduled_check_joins_manual_request(tmp_path, product):
+    scrape = FakeScrape()
+    scheduler, delivered = make_scheduler(tmp_path, scrape)
+
+    async def run():
+        await scheduler.start()
+        request = await scheduled_joins_manual(scheduler, product)
+        assert await asyncio.wait_for(request, 2) == 1
+        # the joined scheduled check reschedules once the shared result is in
+        await asyncio.sleep(0.05)
+        await scheduler.stop()
+
+    asyncio.run(run())
+    assert len(scrape.calls) == 1
+    assert delivered == ['manual']
+    assert scheduler.next_check_in(product) > 3000
+
+
+@pytest.mark.parametrize('join', [manual_joins_scheduled, scheduled_joins_manual])
+def test_stop_during_joined_check(tmp_path, product, join):
+    scrape = FakeScrape()
+    scheduler, delivered = make_scheduler(tmp_path, scrape)
+
+    async def run():
+        await scheduler.start()
+        request = await join(scheduler, product)
+        await scheduler.stop()
+        with pytest.raises(asyncio.CancelledError):
+            await asyncio.wait_for(request, 2)
+        assert not scheduler._flights.inflight(product.url)
+        assert delivered == []
+
+        # restarting picks the product up again, and requests no longer join a dead flight
+        await scheduler.start()
+        assert await asyncio.wait_for(scheduler.request(product), 2) is not None
+        await scheduler.stop()
+
+    asyncio.run(run())
+    assert scrape.overlaps == []
+
+
+def test_manual_request_waits_for_host_ahead_of_scheduled_checks():
+    budget = HostBudget(min_gap=0.1, jitter=0)
+    order = []
+
+    async def take(name, priority, delay=0):
+        await asyncio.sleep(delay)
+        await budget.acquire(URL, priority=priority)
+        order.append(name)
+
+    async def run():
+        await asyncio.gather(
+            take('scheduled 1', False), take('scheduled 2', False), take('scheduled 3', False),
+            take('manual', True, delay=0.05),
+        )
+
+    asyncio.run(run())
+    assert order == ['scheduled 1', 'manual', 'scheduled 2', 'scheduled 3']
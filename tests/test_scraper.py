@@ -0,0 +1,65 @@
+"""chrome price reading against a scripted fake driver"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import scraper
+from retailers import WALMART
+from scraper import SelectorOrder, get_chrome_price
+
+URL = 'https://www.walmart.com/ip/1'
+# what a client-rendered page looks like at DOMContentLoaded: price containers and
+# structured data tags without a price in them yet
+EMPTY_PAGE = {
+    'matches': [["div[class*='price']", 'Price when purchased online', '<span>Price when purchased online</span>']],
+    'structured': '<script type="application/ld+json">{"@type": "Product", "name": "SSD"}</script>',
+    'transferred': 1000,
+}
+PRICED_PAGE = {
+    'matches': EMPTY_PAGE['matches'] + [["span[itemprop='price']", '$139.99', '$139.99']],
+    'structured': EMPTY_PAGE['structured'],
+    'transferred': 5000,
+}
+
+
+class FakeDriver:
+    def __init__(self, pages):
+        self.pages = list(pages)
+        self.scripts = []
+
+    def get(self, url):
+        pass
+
+    def execute_script(self, script, *args):
+        if script == 'window.stop()':
+            self.scripts.append('stop')
+            return None
+        self.scripts.append('search')
+        return self.pages.pop(0) if len(self.pages) > 1 else self.pages[0]
+
+
+def test_waits_for_a_parseable_price(monkeypatch):
+    monkeypatch.setattr(scraper, 'PRICE_POLL_INTERVAL', 0)
+    driver = FakeDriver([EMPTY_PAGE, EMPTY_PAGE, PRICED_PAGE])
+    timings = {}
+
+    price, transferred, time_to_price = get_chrome_price(driver, URL, SelectorOrder(WALMART.selectors), timings, plan=WALMART)
+
+    assert price == 139.99
+    assert transferred == 5000
+    # the page is only stopped once the price has rendered
+    assert driver.scripts == ['search', 'search', 'search', 'stop']
+    assert set(timings) == {'navigation', 'selector_search', 'parse'}
+
+
+def test_gives_up_after_the_ready_timeout(monkeypatch):
+    monkeypatch.setattr(scraper, 'PRICE_POLL_INTERVAL', 0)
+    monkeypatch.setattr(scraper, 'PRICE_READY_TIMEOUT', 0.05)
+    driver = FakeDriver([EMPTY_PAGE])
+
+    price, transferred, time_to_price = get_chrome_price(driver, URL, SelectorOrder(WALMART.selectors), plan=WALMART)
+
+    assert price is None
+    assert time_to_price is None
+    assert driver.scripts[-1] == 'stop'
@@ -0,0 +1,104 @@
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+WATCHLIST_FILE = os.getenv('WATCHLIST_FILE', 'watchlist.json')
+
+
+class Product:
+    """a single watched product with its own target price and check interval"""
+
+    def __init__(self, url, target_price, interval, name=None):
+        self.url = url
+        self.target_price = float(target_price)
+        self.interval = int(interval)
+        self.name = name or url
+        self.check_count = 0
+        self.last_price = None
+        # adaptive scheduling state: consecutive failed checks, when the price last moved
+        # and when it was first observed by this process (unix time)
+        self.failures = 0
+        self.changed_at = None
+        self.observed_since = None
+        # monotonic time the scheduler expects to check this product next
+        self.next_due = None
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'url': self.url,
+            'target_price': self.target_price,
+            'interval': self.interval,
+        }
+
+    @classmethod
+    def from_dict(cls, data, default_interval):
+        return cls(
+            url=data['url'],
+            target_price=data['target_price'],
+            interval=data.get('interval', default_interval),
+            name=data.get('name'),
+        )
+
+
+class Watchlist:
+    """ordered set of products keyed by url, persisted as json"""
+
+    def __init__(self, path=WATCHLIST_FILE):
+        self.path = path
+        self._products = {}
+
+    def __iter__(self):
+        return iter(list(self._products.values()))
+
+    def __len__(self):
+        return len(self._products)
+
+    def load(self, default_interval, seed=None):
+        """load products from disk, falling back to the seed product if the file is missing"""
+        if os.path.exists(self.path):
+            with open(self.path, encoding='utf-8') as f:
+                for entry in json.load(f):
+                    product = Product.from_dict(entry, default_interval)
+                    self._products[product.url] = product
+            logger.info(f"loaded {len(self._products)} products from {self.path}")
+        elif seed is not None:
+            self._products[seed.url] = seed
+            logger.info(f"no watchlist at {self.path}, watching default product")
+        return self
+
+    def save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump([p.to_dict() for p in self._products.values()], f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def add(self, product):
+        self._products[product.url] = product
+        self.save()
+        return product
+
+    def remove(self, product):
+        self._products.pop(product.url, None)
+        self.save()
+
+    def get(self, url):
+        return self._products.get(url)
+
+    def find(self, query):
+        """find a product by 1-based list index, url or case-insensitive name"""
+        products = list(self._products.values())
+        if query is None:
+            return products[0] if len(products) == 1 else None
+        if str(query).isdigit():
+            index = int(query) - 1
+            return products[index] if 0 <= index < len(products) else None
+        if query in self._products:
+            return self._products[query]
+        query = str(query).lower()
+        for product in products:
+            if product.name.lower() == query:
+                return product
+        return None
@@ -0,0 +1,248 @@
+import itertools
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import types
+import zlib
+from concurrent.futures import Future, TimeoutError as ResultTimeout
+
+from browser import PREWARM_DRIVERS, DriverPool
+from metrics import DRIVER_RESTARTS, WORKER_RESTARTS, CheckTrace
+from scraper import ExtractionStats, PriceScraper, ScrapeResult
+from screenshots import ScreenshotRing
+
+logger = logging.getLogger(__name__)
+
+# number of scrape worker processes; 0 keeps scraping on threads in the bot process
+SCRAPE_PROCESSES = int(os.getenv('SCRAPE_PROCESSES', '0'))
+# a worker still busy with one check after this many seconds is treated as hung and restarted
+WORKER_JOB_TIMEOUT = float(os.getenv('WORKER_JOB_TIMEOUT', '180'))
+# respawn backoff for worker processes that keep dying: 1s, 2s, 4s, ... capped at 1 minute
+RESPAWN_BACKOFF_MAX = 60
+# extra seconds a caller waits past the job timeouts before giving up on a result
+RESULT_TIMEOUT_MARGIN = 30
+
+
+class WorkerCrashed(Exception):
+    pass
+
+
+# stands in for the parent's __main__ while a shard is started
+_NO_MAIN = types.ModuleType('__main__')
+_main_swap = threading.Lock()
+
+
+def _start_without_main(process):
+    """start a spawned process without re-running the parent's main script in it
+
+    spawn re-imports the parent's __main__ in every child, which for the bot means
+    importing discord, reading its settings and building a second bot per shard. shards
+    only run _shard_main from this module, so they are started while __main__ is a bare
+    module that spawn has nothing to re-import from.
+    """
+    with _main_swap:
+        main = sys.modules['__main__']
+        sys.modules['__main__'] = _NO_MAIN
+        try:
+            process.start()
+        finally:
+            sys.modules['__main__'] = main
+
+
+def _shard_main(shard, jobs, results):
+    """worker process: owns one scraper and chrome, handles one check at a time"""
+    logging.basicConfig(level=logging.INFO, format=f'%(levelname)s:shard {shard}:%(name)s:%(message)s')
+    # the bot process logs the structured check line once it has merged the spans
+    logging.getLogger('metrics').setLevel(logging.WARNING)
+    scraper = PriceScraper(DriverPool(1, name=f'shard {shard}'))
+    if PREWARM_DRIVERS:
+        scraper.prewarm()
+    try:
+        while True:
+            job = jobs.get()
+            if job is None:
+                break
+            job_id, url = job
+            results.put(('start', shard, job_id, None))
+            trace = CheckTrace(url)
+            try:
+                result = scraper.check(0, url, trace)
+            except Exception as e:
+                logger.error(f"error checking {url}: {e}")
+                result = ScrapeResult(None, 'miss', time.monotonic() - trace.started)
+            restarts = sum(manager.restarts for manager in scraper.drivers.managers)
+            # captures are handed to the bot process's ring rather than kept here
+            shots = scraper.screenshots.drain()
+            results.put(('done', shard, job_id, (result, trace.spans, restarts, shots)))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        scraper.close()
+
+
+class Shard:
+    def __init__(self, index):
+        self.index = index
+        self.process = None
+        self.jobs = None
+        self.current = None
+        self.failures = 0
+        self.respawn_at = 0
+        self.driver_restarts = 0
+
+
+class ProcessScraper:
+    """shards checks across worker processes by url, each process owning its own scraper
+    and chrome, with the same check/stats/close interface as PriceScraper
+
+    jobs go out over a per-shard queue and results come back on one shared queue read
+    by a collector thread. a supervisor thread restarts shards whose process died or
+    hung, failing the checks that were queued on them.
+    """
+
+    def __init__(self, processes, job_timeout=WORKER_JOB_TIMEOUT):
+        self.job_timeout = job_timeout
+        self.stats = ExtractionStats()
+        self.screenshots = ScreenshotRing()
+        # spawn, not fork: the bot process is already running threads and an event loop
+        self._mp = multiprocessing.get_context('spawn')
+        self._results = self._mp.Queue()
+        self._shards = [Shard(i) for i in range(processes)]
+        self._pending = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._closing = False
+
+        for shard in self._shards:
+            self._spawn(shard)
+        threading.Thread(target=self._collect, name='shard-collector', daemon=True).start()
+        threading.Thread(target=self._supervise, name='shard-supervisor', daemon=True).start()
+        logger.info(f"started {processes} scrape worker processes")
+
+    def shard_for(self, url):
+        return self._shards[zlib.crc32(url.encode()) % len(self._shards)]
+
+    def check(self, slot, url, trace=None):
+        """send a check to the url's shard and block until its result comes back"""
+        trace = trace or CheckTrace(url)
+        shard = self.shard_for(url)
+        future = Future()
+        with self._lock:
+            if shard.process is None:
+                raise WorkerCrashed(f"scrape worker {shard.index} is restarting")
+            job_id = next(self._ids)
+            self._pending[job_id] = (shard.index, future)
+            shard.jobs.put((job_id, url))
+            # every job queued on the shard, this one included, may take up to job_timeout
+            queued = sum(1 for index, _ in self._pending.values() if index == shard.index)
+
+        try:
+            result, spans, driver_restarts, shots = future.result(timeout=queued * self.job_timeout + RESULT_TIMEOUT_MARGIN)
+        except ResultTimeout:
+            with self._lock:
+                self._pending.pop(job_id, None)
+            raise WorkerCrashed(f"no result from scrape worker {shard.index} for {url}")
+        for shot in shots:
+            self.screenshots.add(shot)
+
+        if driver_restarts > shard.driver_restarts:
+            DRIVER_RESTARTS.inc(driver_restarts - shard.driver_restarts)
+        shard.driver_restarts = driver_restarts
+        trace.add_all(spans)
+        self.stats.record(result)
+        trace.finish(result)
+        return result
+
+    def prewarm(self):
+        """each worker process prewarms its own chrome as it starts"""
+
+    def close(self):
+        self._closing = True
+        for shard in self._shards:
+            if shard.process is not None:
+                shard.jobs.put(None)
+        for shard in self._shards:
+            if shard.process is not None:
+                shard.process.join(10)
+                if shard.process.is_alive():
+                    shard.process.terminate()
+        self._fail_pending(None, WorkerCrashed("scrape workers shut down"))
+        logger.info("scrape worker processes stopped")
+
+    def _spawn(self, shard):
+        shard.jobs = self._mp.Queue()
+        shard.current = None
+        shard.driver_restarts = 0
+        shard.process = self._mp.Process(
+            target=_shard_main, args=(shard.index, shard.jobs, self._results),
+            name=f'scrape-shard-{shard.index}', daemon=True
+        )
+        _start_without_main(shard.process)
+
+    def _fail_pending(self, shard_index, error):
+        with self._lock:
+            failed = [job_id for job_id, (index, _) in self._pending.items() if shard_index is None or index == shard_index]
+            futures = [self._pending.pop(job_id)[1] for job_id in failed]
+        for future in futures:
+            if not future.done():
+                future.set_exception(error)
+
+    def _collect(self):
+        while True:
+            try:
+                self._collect_one()
+            except (EOFError, OSError):
+                # the results queue is gone, which only happens on shutdown
+                return
+            except Exception as e:
+                # a message that can't be read fails only its own check, via the result timeout
+                logger.error(f"could not read a scrape worker result: {e!r}")
+
+    def _collect_one(self):
+        kind, shard_index, job_id, payload = self._results.get()
+        shard = self._shards[shard_index]
+        if kind == 'start':
+            shard.current = (job_id, time.monotonic())
+            return
+        shard.current = None
+        shard.failures = 0
+        with self._lock:
+            _, future = self._pending.pop(job_id, (None, None))
+        if future is not None and not future.done():
+            future.set_result(payload)
+
+    def _supervise(self):
+        while not self._closing:
+            time.sleep(1)
+            for shard in self._shards:
+                if self._closing:
+                    return
+                process = shard.process
+                if process is None:
+                    if time.monotonic() >= shard.respawn_at:
+                        with self._lock:
+                            self._spawn(shard)
+                        WORKER_RESTARTS.inc()
+                        logger.info(f"restarted scrape worker {shard.index}")
+                    continue
+
+                if process.is_alive():
+                    current = shard.current
+                    if current and time.monotonic() - current[1] > self.job_timeout:
+                        logger.error(f"scrape worker {shard.index} stuck on one check for {self.job_timeout:.0f}s, killing it")
+                        process.kill()
+                        process.join(5)
+                    else:
+                        continue
+
+                # the worker died: fail everything queued on it and respawn after a backoff
+                shard.failures += 1
+                delay = min(2 ** (shard.failures - 1), RESPAWN_BACKOFF_MAX)
+                logger.error(f"scrape worker {shard.index} exited with code {process.exitcode}, restarting in {delay}s")
+                with self._lock:
+                    shard.process = None
+                    shard.respawn_at = time.monotonic() + delay
+                self._fail_pending(shard.index, WorkerCrashed(f"scrape worker {shard.index} died"))